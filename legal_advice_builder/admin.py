@@ -1,16 +1,18 @@
-import os.path
-import tempfile
-
 from django.contrib import admin
-from django.core import serializers
+from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.core.management import call_command
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import re_path
+from django.utils.translation import gettext_lazy as _
 from treebeard.admin import TreeAdmin
 from treebeard.forms import movenodeform_factory
 
+from .exporter import get_export_querysets
+from .exporter import iter_export_json
+from .exporter import iter_gzip
+from .importer import LawCaseImportError
+from .importer import import_law_cases
 from .models import Answer
 from .models import Condition
 from .models import Document
@@ -75,61 +77,59 @@ class LawcaseAdmin(admin.ModelAdmin):
         return upload_urls + urls
 
     actions = [
-        'export_lawcase'
+        'publish_lawcase',
+        'clone_lawcase',
+        'export_lawcase',
+        'export_lawcase_gzip'
     ]
 
+    def publish_lawcase(self, request, queryset):
+        for law_case in queryset:
+            law_case.publish(creator=request.user)
+
+    publish_lawcase.short_description = _('Publish selected law cases')
+
+    def clone_lawcase(self, request, queryset):
+        for law_case in queryset:
+            law_case.clone(title=_('{} (copy)').format(law_case.title),
+                           creator=request.user)
+
+    clone_lawcase.short_description = _('Duplicate selected law cases')
+
     def export_lawcase(self, request, queryset):
-        lawcases = queryset
-        lawcase_ids = lawcases.values_list('id', flat=True)
-        questionaires = Questionaire.objects.filter(
-            law_case__id__in=lawcase_ids)
-        questionaire_ids = questionaires.values_list('id', flat=True)
-        questions = Question.objects.filter(
-            questionaire__id__in=questionaire_ids)
-        question_ids = questions.values_list('id', flat=True)
-        conditions = Condition.objects.filter(
-            question__id__in=question_ids)
-        text_block_conditions = TextBlockCondition.objects.filter(
-            question__id__in=question_ids
-        )
-        document_ids = lawcases.values_list('document', flat=True)
-        documents = Document.objects.filter(id__in=document_ids)
-        textblocks = TextBlock.objects.filter(document__id__in=document_ids)
-
-        all_objects = [*lawcases, *questionaires, *questions,
-                       *conditions, *text_block_conditions,
-                       *documents, *textblocks]
-        export_json = serializers.serialize('json', all_objects)
-        response = HttpResponse(export_json, content_type='application/json')
+        export_json = iter_export_json(get_export_querysets(queryset))
+        response = StreamingHttpResponse(export_json, content_type='application/json')
         response['Content-Disposition'] = 'attachment; filename=export.json'
         return response
 
+    export_lawcase.short_description = _('Export selected law cases')
+
+    def export_lawcase_gzip(self, request, queryset):
+        export_json = iter_export_json(get_export_querysets(queryset))
+        response = StreamingHttpResponse(iter_gzip(export_json), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename=export.json.gz'
+        return response
+
+    export_lawcase_gzip.short_description = _('Export selected law cases (gzip)')
+
     def upload_lawcase(self, request):
         if not request.method == 'POST':
             raise PermissionDenied
         if not self.has_change_permission(request):
             raise PermissionDenied
-        uploaded_file = request.FILES['file']
-        prefix, suffix = os.path.splitext(uploaded_file.name)
-        destination_path = tempfile.mkstemp(
-            suffix=suffix, prefix=prefix + "_")[1]
-        with open(destination_path, "wb") as fp:
-            for chunk in uploaded_file.chunks():
-                fp.write(chunk)
-        tmp_fixtures = [destination_path]
-        fixtures = [destination_path]
-        call_command(
-            "loaddata",
-            *fixtures,
-        )
-        for tmp_file in tmp_fixtures:
-            os.unlink(tmp_file)
+        try:
+            import_law_cases(request.FILES['file'], creator=request.user)
+        except LawCaseImportError as error:
+            messages.error(request, str(error))
         return redirect('admin:legal_advice_builder_lawcase_changelist')
 
 
 class AnswerAdmin(admin.ModelAdmin):
     model = Answer
     raw_id_fields = ('creator',)
+    list_filter = ('law_case',)
+    list_select_related = ('law_case', 'creator')
+    ordering = ('-created_at',)
 
 
 admin.site.register(Questionaire, QuestionaireAdmin)
@@ -3,10 +3,17 @@ import json
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
+from django.db.models import F
+from django.db.models import Func
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
 from django.forms import formset_factory
 from django.http import HttpResponseRedirect
 from django.http import JsonResponse
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import CreateView
@@ -27,6 +34,7 @@ from .forms import QuestionConditionForm
 from .forms import QuestionCreateForm
 from .forms import QuestionForm
 from .forms import QuestionUpdateForm
+from .models import Answer
 from .models import Document
 from .models import LawCase
 from .models import Question
@@ -34,6 +42,15 @@ from .models import Questionaire
 from .models import TextBlock
 from .models import TextBlockCondition
 from .views import FormWizardView
+from .widgets import get_conditions_payload
+
+
+def count_subquery(queryset):
+    """Returns a subquery counting the rows of a queryset filtered by an OuterRef."""
+    return Coalesce(Subquery(
+        queryset.order_by().annotate(count=Func(F('pk'), function='COUNT')).values('count')
+    ), 0)
+
 
 try:
     PermissionMixin = import_string(
@@ -45,6 +62,7 @@ except (AttributeError):
 class LawCaseList(PermissionMixin, ListView, FormView):
     template_name = 'legal_advice_builder/admin/law_case_list.html'
     form_class = LawCaseCreateForm
+    paginate_by = 24
 
     model = LawCase
 
@@ -65,23 +83,32 @@ class LawCaseList(PermissionMixin, ListView, FormView):
             'legal_advice_builder:questionaire-detail',
                                     args=[law_case.get_first_questionaire().id]))
 
-    def get_update_forms(self):
-        update_forms = []
-        for law_case in self.get_queryset():
-            update_forms.append(
-                (law_case.id, LawCaseUpdateForm(instance=law_case))
-            )
-        return update_forms
+    def get_queryset(self):
+        questionaires = Questionaire.objects.filter(law_case=OuterRef('pk'))
+        queryset = LawCase.objects.annotate(
+            first_questionaire_id=Subquery(questionaires.values('id')[:1]),
+            questionaire_count=count_subquery(questionaires),
+            question_count=count_subquery(
+                Question.objects.filter(questionaire__law_case=OuterRef('pk'))),
+            answer_count=count_subquery(
+                Answer.objects.filter(law_case=OuterRef('pk')))
+        ).order_by('title', 'id')
+        search = self.request.GET.get('q')
+        if search:
+            queryset = queryset.filter(
+                Q(title__icontains=search) | Q(description__icontains=search))
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
-            'update_forms': self.get_update_forms()
+            'search': self.request.GET.get('q', '')
         })
         return context
 
 
 class LawCaseEdit(PermissionMixin, UpdateView):
+    template_name = 'legal_advice_builder/admin/law_case_edit_form.html'
     model = LawCase
     form_class = LawCaseUpdateForm
 
@@ -190,6 +217,10 @@ class DocumentFormView(PermissionMixin, TemplateView):
 
     def post(self, *args, **kwargs):
         data = json.loads(self.request.body)
+        if 'textblocks' in data:
+            return self.save_text_blocks(data.get('textblocks'))
+        if 'move_after' in data:
+            return self.move_text_block(data.get('textblock'), data.get('move_after'))
         content = data.get('content')
         textblock = data.get('textblock')
         document = self.document
@@ -200,7 +231,7 @@ class DocumentFormView(PermissionMixin, TemplateView):
             textblock = TextBlock.objects.create(
                 document=document,
                 content=content,
-                order=document.document_text_blocks.count() + 1
+                order=document.get_next_text_block_order()
             )
         else:
             textblock = TextBlock.objects.get(id=textblock)
@@ -220,6 +251,27 @@ class DocumentFormView(PermissionMixin, TemplateView):
 
         return JsonResponse({'content': textblock.content, 'id': textblock.id})
 
+    def save_text_blocks(self, textblocks):
+        try:
+            text_blocks = self.document.save_text_blocks(textblocks)
+        except (KeyError, TypeError, ValueError) as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return JsonResponse({'textblocks': [
+            {'content': text_block.content, 'id': text_block.id}
+            for text_block in text_blocks
+        ]})
+
+    def move_text_block(self, textblock, previous):
+        text_blocks = self.document.document_text_blocks
+        try:
+            textblock = text_blocks.get(id=textblock)
+            if previous:
+                previous = text_blocks.get(id=previous)
+        except (TextBlock.DoesNotExist, TypeError, ValueError):
+            return JsonResponse({'error': 'Unknown textblock.'}, status=400)
+        textblock.move_after(previous or None)
+        return JsonResponse({'id': textblock.id, 'order': textblock.order})
+
     def get_form(self, data=None):
         return PrepareDocumentForm(document=self.document, data=data)
 
@@ -241,7 +293,18 @@ class DocumentFormView(PermissionMixin, TemplateView):
         return context
 
 
-class QuestionaireDetail(PermissionMixin, DetailView):
+class SingleObjectCacheMixin:
+    """Fetches the object of a detail view only once per request."""
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset=queryset)
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
+
+class QuestionaireDetail(PermissionMixin, SingleObjectCacheMixin, DetailView):
     template_name = 'legal_advice_builder/admin/questionaire_detail.html'
     model = Questionaire
 
@@ -271,6 +334,7 @@ class QuestionaireDetail(PermissionMixin, DetailView):
         context = super().get_context_data(**kwargs)
         question = self.get_object().get_last_question()
         context.update({
+            'question_count': self.object.question_set.count(),
             'current_step': self.object.law_case.get_index_of_questionaire(self.object),
             'question_create_form': QuestionCreateForm(
                 parent_question=question.id if question else None),
@@ -282,6 +346,54 @@ class QuestionaireDetail(PermissionMixin, DetailView):
         return context
 
 
+class QuestionaireQuestions(PermissionMixin, SingleObjectCacheMixin, DetailView):
+    """Returns a window of the questionaire's question tree as json."""
+    model = Questionaire
+    default_limit = 100
+    max_limit = 500
+
+    def get_window(self):
+        try:
+            offset = max(int(self.request.GET.get('offset', 0)), 0)
+            limit = int(self.request.GET.get('limit', self.default_limit))
+        except ValueError:
+            offset, limit = 0, self.default_limit
+        return offset, min(max(limit, 1), self.max_limit)
+
+    def get_question_data(self, question):
+        return {
+            'id': question.id,
+            'text': question.text,
+            'depth': question.depth,
+            'icon': question.icon,
+            'has_error': question.has_error,
+            'url': reverse('legal_advice_builder:question-update', args=[question.id])
+        }
+
+    def get(self, *args, **kwargs):
+        questionaire = self.get_object()
+        offset, limit = self.get_window()
+        questions = questionaire.questions.only(
+            'id', 'text', 'depth', 'field_type', 'options')[offset:offset + limit]
+        return JsonResponse({
+            'count': questionaire.question_set.count(),
+            'offset': offset,
+            'questions': [self.get_question_data(question) for question in questions]
+        })
+
+
+class QuestionaireConditions(PermissionMixin, SingleObjectCacheMixin, DetailView):
+    """Returns the payload the ConditionsWidget shares between the questions of a questionaire."""
+    model = Questionaire
+    max_age = 24 * 60 * 60
+
+    def get(self, *args, **kwargs):
+        response = JsonResponse(get_conditions_payload(self.get_object()))
+        # the widget links to the payload with its version and language
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return response
+
+
 class QuestionaireCreate(PermissionMixin, CreateView):
     model = Questionaire
     form_class = QuestionaireCreateForm
@@ -338,7 +450,7 @@ class QuestionDelete(PermissionMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class QuestionUpdate(PermissionMixin, SuccessMessageMixin, UpdateView):
+class QuestionUpdate(PermissionMixin, SingleObjectCacheMixin, SuccessMessageMixin, UpdateView):
     template_name = 'legal_advice_builder/admin/question_update.html'
     model = Question
     form_class = QuestionUpdateForm
@@ -374,6 +486,8 @@ class QuestionUpdate(PermissionMixin, SuccessMessageMixin, UpdateView):
             'questionaire': questionaire,
             'current_step': questionaire.law_case.get_index_of_questionaire(
                 questionaire),
+            'question_count': questionaire.question_set.count(),
+            'question_index': questionaire.question_set.filter(path__lt=self.object.path).count(),
             'condition_form': QuestionConditionForm(instance=self.object),
             'question_create_form': QuestionCreateForm(
                 parent_question=self.get_object().id),
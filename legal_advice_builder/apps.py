@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class LegalAdviceBuilderConfig(AppConfig):
     name = 'legal_advice_builder'
     verbose_name = "Legal Advice Builder"
+
+    def ready(self):
+        from . import signals  # NOQA
+        if getattr(settings, 'LEGAL_ADVICE_BUILDER_WARM_CACHES', False):
+            from .warmup import WARMUP_DISPATCH_UID
+            from .warmup import warm_caches_on_first_request
+            request_started.connect(warm_caches_on_first_request,
+                                    dispatch_uid=WARMUP_DISPATCH_UID)
@@ -0,0 +1,92 @@
+function QuestionList(container) {
+    this.container = container;
+    this.url = container.getAttribute('data-url');
+    this.count = parseInt(container.getAttribute('data-count'), 10);
+    this.active = container.getAttribute('data-active');
+    this.rowHeight = 42;
+    this.pageSize = 100;
+    this.overscan = 10;
+    this.pages = {};
+    this.questions = [];
+
+    this.spacer = document.createElement('div');
+    this.spacer.style.position = 'relative';
+    this.spacer.style.height = (this.count * this.rowHeight) + 'px';
+    this.rows = document.createElement('div');
+    this.rows.className = 'list-group';
+    this.rows.style.position = 'absolute';
+    this.rows.style.left = '0';
+    this.rows.style.right = '0';
+    this.spacer.appendChild(this.rows);
+    container.appendChild(this.spacer);
+
+    container.addEventListener('scroll', this.render.bind(this));
+    window.addEventListener('resize', this.render.bind(this));
+    this.scrollToActive();
+}
+
+QuestionList.prototype.loadPage = function (page) {
+    if (!this.pages[page]) {
+        const offset = page * this.pageSize;
+        this.pages[page] = fetch(this.url + '?offset=' + offset + '&limit=' + this.pageSize,
+                                 {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(data => {
+                data.questions.forEach((question, index) => {
+                    this.questions[data.offset + index] = question;
+                });
+                this.render();
+            });
+    }
+};
+
+QuestionList.prototype.createRow = function (question) {
+    const row = document.createElement('a');
+    row.href = question.url;
+    row.className = 'list-group-item position-relative list-group-item-action border-0 border-bottom border rounded-0 text-truncate';
+    row.style.height = this.rowHeight + 'px';
+    if (String(question.id) === this.active) {
+        row.classList.add('active');
+    }
+    const icon = document.createElement('i');
+    icon.className = question.icon || '';
+    row.appendChild(icon);
+    row.appendChild(document.createTextNode(' ' + question.text + ' '));
+    if (question.has_error) {
+        const badge = document.createElement('span');
+        badge.className = 'badge bg-danger rounded-pill';
+        badge.innerHTML = '<i class="bi bi-exclamation-lg"></i>';
+        row.appendChild(badge);
+    }
+    return row;
+};
+
+QuestionList.prototype.render = function () {
+    const scrollTop = this.container.scrollTop;
+    const first = Math.max(Math.floor(scrollTop / this.rowHeight) - this.overscan, 0);
+    const last = Math.min(Math.ceil((scrollTop + this.container.clientHeight) / this.rowHeight) + this.overscan,
+                          this.count);
+    for (let page = Math.floor(first / this.pageSize); page * this.pageSize < last; page++) {
+        this.loadPage(page);
+    }
+    const fragment = document.createDocumentFragment();
+    for (let index = first; index < last && this.questions[index]; index++) {
+        fragment.appendChild(this.createRow(this.questions[index]));
+    }
+    this.rows.style.top = (first * this.rowHeight) + 'px';
+    this.rows.replaceChildren(fragment);
+};
+
+QuestionList.prototype.scrollToActive = function () {
+    const index = parseInt(this.container.getAttribute('data-active-index'), 10);
+    if (index > 0) {
+        this.container.scrollTop = Math.max(index * this.rowHeight - this.container.clientHeight / 2, 0);
+    }
+    this.render();
+};
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-question-list]').forEach(function (container) {
+        new QuestionList(container);
+    });
+});
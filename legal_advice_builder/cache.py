@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+
+KEY_PREFIX = 'legal_advice_builder'
+
+local_cache = None
+
+
+def get_local_cache():
+    """Returns a bounded in-process cache that evicts the least recently used entries."""
+    global local_cache
+    if local_cache is None:
+        max_entries = getattr(settings, 'LEGAL_ADVICE_BUILDER_CACHE_MAX_ENTRIES', 1000)
+        local_cache = LocMemCache(KEY_PREFIX, {
+            'TIMEOUT': None,
+            'OPTIONS': {'MAX_ENTRIES': max_entries}
+        })
+    return local_cache
+
+
+def get_cache():
+    try:
+        return caches[settings.LEGAL_ADVICE_BUILDER_CACHE]
+    except AttributeError:
+        return get_local_cache()
+
+
+def has_shared_cache():
+    """Returns if one of the configured django caches is used instead of the in-process cache."""
+    return hasattr(settings, 'LEGAL_ADVICE_BUILDER_CACHE')
+
+
+def make_hash(*parts):
+    data = json.dumps(parts, cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def make_key(name, *parts):
+    return '{}:{}:{}'.format(KEY_PREFIX, name, make_hash(*parts))
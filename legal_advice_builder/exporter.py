@@ -0,0 +1,68 @@
+import json
+import zlib
+from itertools import islice
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Condition
+from .models import Document
+from .models import Question
+from .models import Questionaire
+from .models import TextBlock
+from .models import TextBlockCondition
+
+CHUNK_SIZE = 500
+
+
+def get_export_querysets(lawcases):
+    """Returns the querysets of all objects belonging to the law cases."""
+    lawcase_ids = lawcases.values_list('id', flat=True)
+    questionaires = Questionaire.objects.filter(
+        law_case__id__in=lawcase_ids)
+    questionaire_ids = questionaires.values_list('id', flat=True)
+    questions = Question.objects.filter(
+        questionaire__id__in=questionaire_ids)
+    question_ids = questions.values_list('id', flat=True)
+    conditions = Condition.objects.filter(
+        question__id__in=question_ids)
+    text_block_conditions = TextBlockCondition.objects.filter(
+        question__id__in=question_ids
+    )
+    document_ids = lawcases.values_list('document', flat=True)
+    documents = Document.objects.filter(id__in=document_ids)
+    textblocks = TextBlock.objects.filter(document__id__in=document_ids)
+    return [lawcases, questionaires, questions,
+            conditions, text_block_conditions,
+            documents, textblocks]
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def iter_export_json(querysets, chunk_size=CHUNK_SIZE):
+    """Yields the querysets serialized as one json fixture, chunk by chunk."""
+    yield '['
+    separator = ''
+    for queryset in querysets:
+        objects = queryset.iterator(chunk_size=chunk_size)
+        for chunk in iter_chunks(objects, chunk_size):
+            serialized = [json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False)
+                          for obj in serializers.serialize('python', chunk)]
+            yield separator + ', '.join(serialized)
+            separator = ', '
+    yield ']'
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,190 @@
+from .utils import DEADLINE_OPTIONS
+from .utils import make_dict_key
+
+
+class Flow:
+    """The navigation through the questions of a law case.
+
+    Subclasses tell where the questionaires, questions and conditions are
+    read from: ModelFlow reads the authoring tables, PublishedLawCase in
+    snapshot.py the objects built from a published snapshot.
+    """
+
+    def get_question(self, question_id):
+        raise NotImplementedError
+
+    def get_questions(self, questionaire):
+        """Returns the questions of the questionaire in tree order."""
+        raise NotImplementedError
+
+    def get_first_question(self, questionaire=None):
+        """Returns the first question of the questionaire, by default of the first one."""
+        raise NotImplementedError
+
+    def get_next_questionaire(self, questionaire):
+        raise NotImplementedError
+
+    def get_index_of_questionaire(self, questionaire):
+        raise NotImplementedError
+
+    def questionaire_count(self):
+        raise NotImplementedError
+
+    def find_question(self, question_short_title, questionaire_short_title=None):
+        """Returns the first question with the short titles or None."""
+        raise NotImplementedError
+
+    def get_question_map(self, answers):
+        """Returns the questions of the answers by id."""
+        raise NotImplementedError
+
+    def get_conditions(self, question):
+        """Returns the conditions of the question ordered by id."""
+        raise NotImplementedError
+
+    def get_then_question(self, condition):
+        raise NotImplementedError
+
+    def get_next_question(self, question):
+        """Returns the question explicitly set as next question or None."""
+        raise NotImplementedError
+
+    def get_first_child(self, question):
+        raise NotImplementedError
+
+    def has_document(self, question):
+        raise NotImplementedError
+
+    def get_first_question_of_next_questionaire(self, question):
+        next_questionaire = self.get_next_questionaire(question.questionaire)
+        if next_questionaire:
+            return self.get_first_question(next_questionaire)
+        return None
+
+    def is_status_by_conditions(self, question, status, option=None, date=None, text=None):
+        conditions = [condition for condition in self.get_conditions(question)
+                      if condition.then_value == status]
+        if question.field_type in [question.SINGLE_OPTION, question.YES_NO,
+                                   question.TEXT, question.SINGLE_LINE] and (option or text):
+            for condition in conditions:
+                if condition.if_option == 'is' and condition.if_value in [option, text]:
+                    return condition
+        elif question.field_type == question.DATE and date:
+            for condition in conditions:
+                if condition.if_option in DEADLINE_OPTIONS and condition.evaluate_date(date):
+                    return condition
+        return False
+
+    def check_for_success(self, question, option=None, text=None, date=None):
+        if option or date or text:
+            if self.is_status_by_conditions(question, 'success', option, date, text):
+                return self.get_first_question_of_next_questionaire(question)
+            if option or text:
+                for condition in self.get_conditions(question):
+                    if condition.if_option == 'is' and condition.if_value in [option, text] and \
+                            condition.then_value == 'question' and condition.then_question_id:
+                        return self.get_then_question(condition)
+        return False
+
+    def get_next(self, question, option=None, text=None, date=None):
+        next_by_condition = self.check_for_success(question, option=option, text=text, date=date)
+        if next_by_condition is not False:
+            return next_by_condition
+        next_question = self.get_next_question(question)
+        if next_question:
+            return next_question
+        if question.is_last:
+            return self.get_first_question_of_next_questionaire(question)
+        first_child = self.get_first_child(question)
+        if first_child:
+            return first_child
+        return self.get_first_question_of_next_questionaire(question)
+
+    def get_status(self, question, option=None, text=None, date=None):
+        next_question = self.get_next(question, option, text, date)
+        if option or date or text:
+            condition_success = self.is_status_by_conditions(
+                question, 'success', option=option, date=date, text=text)
+            condition_failure = self.is_status_by_conditions(
+                question, 'failure', option=option, date=date, text=text)
+            if (condition_success or
+               (not next_question and not condition_failure and not self.has_document(question)) or
+               (question.is_last and not condition_failure)):
+                return {
+                    'success': True,
+                    'message': question.questionaire.success_message,
+                    'next': next_question
+                }
+            elif condition_failure:
+                return {
+                    'failure': True,
+                    'message': condition_failure.message,
+                }
+        return {
+            'ongoing': True,
+            'next': next_question
+        }
+
+    def success_message_with_data(self, questionaire, answer):
+        return questionaire.success_message_with_data(
+            answer, questions=self.get_question_map(answer.answers))
+
+
+class ModelFlow(Flow):
+    """The flow of a law case as it is currently edited."""
+
+    def __init__(self, law_case=None):
+        self.law_case = law_case
+
+    def get_question(self, question_id):
+        from .models import Question
+        return Question.objects.get(id=question_id)
+
+    def get_questions(self, questionaire):
+        return questionaire.questions
+
+    def get_first_question(self, questionaire=None):
+        if questionaire is None:
+            questionaire = self.law_case.get_first_questionaire()
+        return questionaire.get_first_question()
+
+    def get_next_questionaire(self, questionaire):
+        return questionaire.next()
+
+    def get_index_of_questionaire(self, questionaire):
+        return self.law_case.get_index_of_questionaire(questionaire)
+
+    def questionaire_count(self):
+        return self.law_case.questionaire_count()
+
+    def find_question(self, question_short_title, questionaire_short_title=None):
+        from .models import Question
+        if questionaire_short_title:
+            questions = Question.objects.filter(
+                dict_key=make_dict_key(None, questionaire_short_title, None, question_short_title),
+                questionaire__short_title=questionaire_short_title)
+        else:
+            questions = Question.objects.filter(short_title=question_short_title)
+        if self.law_case is not None:
+            questions = questions.filter(questionaire__law_case=self.law_case)
+        return questions.first()
+
+    def get_question_map(self, answers):
+        from .models import Question
+        return Question.objects.select_related('questionaire').in_bulk(
+            [int(answer.get('question')) for answer in answers])
+
+    def get_conditions(self, question):
+        return sorted(question.conditions.all(), key=lambda condition: condition.pk)
+
+    def get_then_question(self, condition):
+        return condition.then_question
+
+    def get_next_question(self, question):
+        return question.next_question
+
+    def get_first_child(self, question):
+        return question.get_children().first()
+
+    def has_document(self, question):
+        return question.questionaire.law_case.document_id is not None
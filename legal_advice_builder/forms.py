@@ -1,6 +1,7 @@
 import json
 
 from django import forms
+from django.db import transaction
 from django.forms import fields
 from django.forms.models import model_to_dict
 from django.utils import dateformat
@@ -197,41 +198,85 @@ class QuestionConditionForm(FormControllClassMixin, forms.ModelForm):
         return options
 
     def save_default_next(self):
+        """Saves the question if the default next question was changed."""
         if 'default_next' in self.cleaned_data:
             default_next = self.cleaned_data.get('default_next')
             if default_next == 'next':
-                self.instance.next_question = None
-                self.instance.is_last = True
+                next_question_id, is_last = None, True
             elif default_next == 'default':
-                self.instance.is_last = False
-                self.instance.next_question = None
+                next_question_id, is_last = None, False
             else:
-                self.instance.is_last = False
-                next_question = Question.objects.get(id=default_next)
-                self.instance.next_question = next_question
-            self.instance.save()
+                next_question_id, is_last = int(default_next), False
+            if (self.instance.next_question_id, self.instance.is_last) != (next_question_id, is_last):
+                self.instance.next_question_id = next_question_id
+                self.instance.is_last = is_last
+                self.instance.save()
+
+    def get_then_questions(self, conditions):
+        """Returns the questions referenced by the conditions, fetched in one query."""
+        ids = [str(condition.get('then_question')) for condition in conditions
+               if 'question' in condition.get('then_value', '')]
+        questions = Question.objects.in_bulk([id for id in ids if id.isdigit()])
+        return {str(pk): question for pk, question in questions.items()}
+
+    def get_submitted_conditions(self, conditions):
+        """Returns the submitted conditions by their unique (if_value, then_value)."""
+        conditions = [condition for condition in conditions if condition.get('then_value')]
+        then_questions = self.get_then_questions(conditions)
+        submitted = {}
+        for condition in conditions:
+            then_value = condition['then_value']
+            then_question = None
+            if 'question' in then_value:
+                then_question = then_questions.get(str(condition.get('then_question')))
+                if then_question:
+                    then_value = 'question'
+            submitted[(condition.get('if_value'), then_value)] = Condition(
+                question=self.instance,
+                if_option=condition.get('if_option'),
+                if_value=condition.get('if_value'),
+                then_value=then_value,
+                then_question=then_question,
+                message=condition.get('message', '')
+            )
+        return submitted
+
+    def save_conditions(self, conditions):
+        """Applies only the differences to the stored conditions.
+
+        Returns whether any condition was created, changed or deleted.
+        """
+        fields = ['if_option', 'then_question', 'message']
+        submitted = self.get_submitted_conditions(conditions)
+        existing = {(condition.if_value, condition.then_value): condition
+                    for condition in self.instance.conditions.all()}
+        deleted = [condition.id for key, condition in existing.items()
+                   if key not in submitted]
+        created = [condition for key, condition in submitted.items()
+                   if key not in existing]
+        updated = []
+        for key, condition in submitted.items():
+            if key in existing:
+                old = existing[key]
+                if any(getattr(old, field.attname) != getattr(condition, field.attname)
+                       for field in map(Condition._meta.get_field, fields)):
+                    condition.id = old.id
+                    updated.append(condition)
+        with transaction.atomic():
+            if deleted:
+                Condition.objects.filter(id__in=deleted).delete()
+            if updated:
+                Condition.objects.bulk_update(updated, fields)
+            if created:
+                Condition.objects.bulk_create(created)
+        return bool(deleted or updated or created)
 
     def save(self, commit=True):
         self.save_default_next()
         if self.cleaned_data['conditions']:
-            self.instance.conditions.all().delete()
             conditions = json.loads(self.cleaned_data.pop('conditions'))
-            for condition in conditions:
-                if 'id' in condition:
-                    condition.pop('id')
-                condition['question'] = self.instance
-                if condition.get('then_value'):
-                    if 'question' in condition.get('then_value'):
-                        question_id = condition.get('then_question')
-                        question = Question.objects.filter(
-                            id=question_id).first()
-                        if question:
-                            condition['then_value'] = 'question'
-                            condition['then_question'] = question
-                    else:
-                        if 'then_question' in condition:
-                            condition.pop('then_question')
-                    condition = Condition.objects.create(**condition)
+            if self.save_conditions(conditions):
+                Questionaire.bump_version(id=self.instance.questionaire_id)
         return self.instance
 
 
@@ -0,0 +1,301 @@
+import gzip
+import io
+import json
+
+from django.core import serializers
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db import transaction
+
+from .exporter import get_export_querysets
+from .models import Condition
+from .models import Document
+from .models import LawCase
+from .models import Question
+from .models import Questionaire
+from .models import TextBlock
+from .models import TextBlockCondition
+from .utils import bulk_create_with_pks
+from .utils import clean_html_field
+
+CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+MODELS = {
+    model._meta.label_lower: model for model in [
+        LawCase, Questionaire, Question, Condition,
+        TextBlockCondition, Document, TextBlock
+    ]
+}
+
+
+class LawCaseImportError(Exception):
+    pass
+
+
+def open_fixture(file):
+    """Returns a text stream of a binary, optionally gzip compressed, fixture file."""
+    stream = io.BufferedReader(file) if not hasattr(file, 'peek') else file
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in ' \t\r\n,':
+        position += 1
+    return position
+
+
+def iter_fixture_objects(stream, chunk_size=CHUNK_SIZE):
+    """Yields the objects of a json fixture without reading it into memory at once."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise LawCaseImportError('The file is not a json fixture.')
+    position = 1
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = skip_separators(buffer, 0)
+        while position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise LawCaseImportError('The file is not a valid json fixture.')
+                break
+            yield obj
+            position = skip_separators(buffer, position)
+        if not chunk:
+            raise LawCaseImportError('The json fixture is incomplete.')
+
+
+class LawCaseImporter:
+    """Imports law cases exported with LawcaseAdmin.export_lawcase.
+
+    All objects get new primary keys, so imported law cases never
+    overwrite existing ones. Each model is inserted with one bulk_create
+    inside a single transaction.
+    """
+
+    def __init__(self, creator=None, batch_size=500):
+        self.creator = creator
+        self.batch_size = batch_size
+        self.records = {label: [] for label in MODELS}
+        self.pks = {label: {} for label in MODELS}
+
+    def add(self, record):
+        if not isinstance(record, dict) or not isinstance(record.get('fields'), dict):
+            raise LawCaseImportError('The fixture contains an invalid record.')
+        label = str(record.get('model', '')).lower()
+        if label not in MODELS:
+            raise LawCaseImportError('Unsupported model "{}".'.format(record.get('model')))
+        self.records[label].append(record)
+
+    def add_records(self, records):
+        for record in records:
+            self.add(record)
+
+    def add_law_cases(self, lawcases):
+        for queryset in get_export_querysets(lawcases):
+            self.add_records(serializers.serialize('python', queryset.iterator()))
+
+    def get_pk(self, model, old_pk):
+        if old_pk is None:
+            return None
+        try:
+            return self.pks[model._meta.label_lower][old_pk]
+        except KeyError:
+            raise LawCaseImportError('{} {} is missing in the import.'.format(
+                model.__name__, old_pk))
+
+    def build(self, model, record, **related):
+        """Returns an unsaved instance with the foreign keys given in related."""
+        obj = model()
+        for name, value in record['fields'].items():
+            field = model._meta.get_field(name)
+            if field.is_relation:
+                continue
+            setattr(obj, field.attname, field.to_python(value))
+        for name, value in related.items():
+            setattr(obj, model._meta.get_field(name).attname, value)
+        return obj
+
+    def create(self, model, objects):
+        label = model._meta.label_lower
+        bulk_create_with_pks(model, objects, batch_size=self.batch_size)
+        for record, obj in zip(self.records[label], objects):
+            self.pks[label][record['pk']] = obj.pk
+        return objects
+
+    def import_documents(self):
+        self.documents = self.create(Document, [
+            self.build(Document, record)
+            for record in self.records['legal_advice_builder.document']
+        ])
+
+    def remap_sample_answers(self, sample_answers):
+        """Returns the sample answers with the question ids of the import.
+
+        Answers to questions that are not part of the import are dropped.
+        """
+        if not isinstance(sample_answers, list):
+            return sample_answers
+        question_pks = self.pks['legal_advice_builder.question']
+        remapped = []
+        for answer in sample_answers:
+            if not isinstance(answer, dict):
+                raise ValueError('Invalid sample answer {!r}.'.format(answer))
+            question = question_pks.get(int(answer.get('question')))
+            if question is not None:
+                # the admin stores the question ids as strings
+                question = str(question) if isinstance(answer['question'], str) else question
+                remapped.append(dict(answer, question=question))
+        return remapped
+
+    def import_sample_answers(self):
+        for document in self.documents:
+            document.sample_answers = self.remap_sample_answers(document.sample_answers)
+        Document.objects.bulk_update(self.documents, ['sample_answers'],
+                                     batch_size=self.batch_size)
+
+    def get_free_slugs(self, records):
+        slugs = [record['fields'].get('slug') for record in records]
+        taken = set(LawCase.objects.filter(slug__in=[slug for slug in slugs if slug])
+                    .values_list('slug', flat=True))
+        return [None if not slug or slug in taken else slug for slug in slugs]
+
+    def import_law_cases(self):
+        records = self.records['legal_advice_builder.lawcase']
+        law_cases = []
+        for record, slug in zip(records, self.get_free_slugs(records)):
+            law_case = self.build(
+                LawCase, record,
+                document=self.get_pk(Document, record['fields'].get('document')),
+                creator=self.creator.pk if self.creator else None
+            )
+            law_case.slug = slug
+            law_case.published_version = None
+            law_cases.append(law_case)
+        return self.create(LawCase, law_cases)
+
+    def import_questionaires(self):
+        self.create(Questionaire, [
+            self.build(Questionaire, record,
+                       law_case=self.get_pk(LawCase, record['fields']['law_case']))
+            for record in self.records['legal_advice_builder.questionaire']
+        ])
+
+    def get_root_paths(self, records):
+        """Returns new root paths for the question trees of the import."""
+        steplen = Question.steplen
+        old_roots = sorted({record['fields']['path'][:steplen] for record in records})
+        last_root = Question.get_last_root_node()
+        step = Question._str2int(last_root.path[:steplen]) if last_root else 0
+        root_paths = {}
+        for old_root in old_roots:
+            step += 1
+            root_paths[old_root] = Question._get_path(None, 1, step)
+        return root_paths
+
+    def import_questions(self):
+        records = self.records['legal_advice_builder.question']
+        steplen = Question.steplen
+        root_paths = self.get_root_paths(records)
+        paths = {record['fields']['path'] for record in records}
+        questions = []
+        for record in records:
+            path = record['fields']['path']
+            if path[:steplen] not in paths:
+                raise LawCaseImportError('The root of question {} is missing.'.format(record['pk']))
+            question = self.build(
+                Question, record,
+                questionaire=self.get_pk(Questionaire, record['fields'].get('questionaire')))
+            question.path = root_paths[path[:steplen]] + path[steplen:]
+            questions.append(question)
+        self.create(Question, questions)
+
+        next_questions = []
+        for record, question in zip(records, questions):
+            next_question = record['fields'].get('next_question')
+            if next_question:
+                question.next_question_id = self.get_pk(Question, next_question)
+                next_questions.append(question)
+        Question.objects.bulk_update(next_questions, ['next_question'],
+                                     batch_size=self.batch_size)
+        Question.refresh_dict_keys(
+            questionaire__in=self.pks['legal_advice_builder.questionaire'].values())
+
+    def get_then_question(self, record):
+        then_question = record['fields'].get('then_question')
+        return self.pks['legal_advice_builder.question'].get(then_question)
+
+    def import_conditions(self):
+        self.create(Condition, [
+            self.build(Condition, record,
+                       question=self.get_pk(Question, record['fields']['question']),
+                       then_question=self.get_then_question(record))
+            for record in self.records['legal_advice_builder.condition']
+        ])
+
+    def import_text_blocks(self):
+        text_blocks = []
+        for record in self.records['legal_advice_builder.textblock']:
+            text_block = self.build(
+                TextBlock, record,
+                document=self.get_pk(Document, record['fields']['document']))
+            text_block.content = clean_html_field(text_block.content)
+            text_blocks.append(text_block)
+        self.create(TextBlock, text_blocks)
+
+    def import_text_block_conditions(self):
+        self.create(TextBlockCondition, [
+            self.build(TextBlockCondition, record,
+                       text_block=self.get_pk(TextBlock, record['fields']['text_block']),
+                       question=self.get_pk(Question, record['fields']['question']))
+            for record in self.records['legal_advice_builder.textblockcondition']
+        ])
+
+    def run(self):
+        """Imports the added records and returns the created law cases.
+
+        Malformed records raise a LawCaseImportError and nothing is imported.
+        """
+        try:
+            with transaction.atomic():
+                self.import_documents()
+                law_cases = self.import_law_cases()
+                self.import_questionaires()
+                self.import_questions()
+                self.import_sample_answers()
+                self.import_conditions()
+                self.import_text_blocks()
+                self.import_text_block_conditions()
+                # new versions, and has_deadlines for exports that don't have it yet
+                Document.bump_version(id__in=self.pks['legal_advice_builder.document'].values())
+        except (KeyError, TypeError, ValueError, FieldDoesNotExist,
+                ValidationError, IntegrityError, RuntimeError) as error:
+            raise LawCaseImportError('The fixture contains invalid records ({}: {}).'.format(
+                type(error).__name__, error)) from error
+        return law_cases
+
+
+def import_law_cases(file, creator=None):
+    """Imports the law cases of an exported, optionally gzip compressed, json file."""
+    importer = LawCaseImporter(creator=creator)
+    importer.add_records(iter_fixture_objects(open_fixture(file)))
+    return importer.run()
+
+
+def clone_law_case(law_case, title=None, creator=None):
+    """Copies the law case with its questionaires, questions and document."""
+    importer = LawCaseImporter(creator=creator)
+    with transaction.atomic():
+        importer.add_law_cases(LawCase.objects.filter(pk=law_case.pk))
+        if title is not None:
+            importer.records['legal_advice_builder.lawcase'][0]['fields']['title'] = title
+        return importer.run()[0]
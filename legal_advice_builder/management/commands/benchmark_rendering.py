@@ -0,0 +1,68 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from legal_advice_builder.models import Document
+from legal_advice_builder.rendering import DjangoTemplateRenderer
+from legal_advice_builder.rendering import PlaceholderRenderer
+from legal_advice_builder.utils import generate_answers_dict_for_template
+
+PARAGRAPH = ('<p>Sehr geehrte Damen und Herren, hiermit widerspreche ich '
+             '{{{{ answers.qn_{0}_name }}}} der Verarbeitung meiner Daten '
+             'vom {{{{ answers.qn_{0}_date }}}} & fordere Sie auf, '
+             'die Angaben zu "{{{{ answers.qn_{0}_reason }}}}" zu '
+             'l&ouml;schen.</p>')
+
+
+class Command(BaseCommand):
+    help = 'Compares the render backends on a real-size document.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document', type=int,
+                            help='id of a document rendered with its sample answers')
+        parser.add_argument('--blocks', type=int, default=150,
+                            help='number of textblocks of the generated document')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def get_generated_document(self, blocks):
+        content = ' '.join([PARAGRAPH.format(index) for index in range(blocks)])
+        answers_dict = {}
+        for index in range(blocks):
+            answers_dict.update({
+                'qn_{}_name'.format(index): 'Mickey <Mouse>',
+                'qn_{}_date'.format(index): '2020-01-10',
+                'qn_{}_reason'.format(index): 'Werbung & Marketing'
+            })
+        return content, answers_dict
+
+    def get_document(self, document_id):
+        document = Document.objects.get(id=document_id)
+        answers_dict = generate_answers_dict_for_template(document.sample_answers)
+        text_blocks = document.get_displayed_text_blocks(answers_dict)
+        content = ' '.join([text_block.content for text_block in text_blocks])
+        return content, answers_dict
+
+    def handle(self, *args, **options):
+        if options['document']:
+            content, answers_dict = self.get_document(options['document'])
+        else:
+            content, answers_dict = self.get_generated_document(options['blocks'])
+        iterations = options['iterations']
+        self.stdout.write('Document with {} characters, {} iterations'.format(
+            len(content), iterations))
+
+        results = []
+        for renderer in [DjangoTemplateRenderer(), PlaceholderRenderer()]:
+            compiled = renderer.compile(content)
+            results.append(renderer.render(compiled, answers_dict))
+            compile_time = timeit.timeit(
+                lambda: renderer.compile(content), number=iterations)
+            render_time = timeit.timeit(
+                lambda: renderer.render(compiled, answers_dict), number=iterations)
+            self.stdout.write('{}: compile {:.3f} ms, render {:.3f} ms'.format(
+                renderer.__class__.__name__,
+                compile_time / iterations * 1000,
+                render_time / iterations * 1000))
+
+        if results[0] != results[1]:
+            self.stderr.write('The render backends returned different results.')
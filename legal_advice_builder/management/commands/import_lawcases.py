@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from legal_advice_builder.importer import LawCaseImportError
+from legal_advice_builder.importer import import_law_cases
+
+
+class Command(BaseCommand):
+    help = 'Imports law cases from exported, optionally gzip compressed, json files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            with open(path, 'rb') as file:
+                try:
+                    law_cases = import_law_cases(file)
+                except LawCaseImportError as error:
+                    raise CommandError('{}: {}'.format(path, error))
+            for law_case in law_cases:
+                self.stdout.write('Imported {} ({})'.format(law_case.title, law_case.id))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from legal_advice_builder.models import LawCase
+from legal_advice_builder.warmup import DEFAULT_WORKERS
+from legal_advice_builder.warmup import warm_caches
+
+
+class Command(BaseCommand):
+    help = 'Loads the flows, documents and pdf stylesheets of law cases into the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('law_cases', nargs='*', type=int,
+                            help='ids of the law cases, all law cases if omitted')
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help='number of law cases warmed in parallel')
+
+    def handle(self, *args, **options):
+        law_cases = LawCase.objects.select_related('document')
+        if options['law_cases']:
+            law_cases = law_cases.filter(id__in=options['law_cases'])
+        start = time.perf_counter()
+        failed = 0
+        for law_case, seconds, error in warm_caches(law_cases, workers=options['workers']):
+            if error:
+                failed += 1
+                self.stderr.write('Failed {} ({}) after {:.2f}s: {}'.format(
+                    law_case.title, law_case.id, seconds, error))
+            else:
+                self.stdout.write('Warmed {} ({}) in {:.2f}s'.format(
+                    law_case.title, law_case.id, seconds))
+        self.stdout.write('Done in {:.2f}s'.format(time.perf_counter() - start))
+        if failed:
+            raise CommandError('{} law cases failed.'.format(failed))
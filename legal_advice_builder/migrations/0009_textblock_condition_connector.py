@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0008_alter_answer_creator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textblock',
+            name='condition_connector',
+            field=models.CharField(choices=[('and', 'all conditions apply'), ('or', 'at least one condition applies')], default='and', max_length=3),
+        ),
+    ]
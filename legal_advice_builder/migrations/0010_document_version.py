@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0009_textblock_condition_connector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0010_document_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='completion_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-19 17:59
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0011_answer_completion_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionaire',
+            name='version',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024
+
+
+def spread_text_block_orders(apps, schema_editor):
+    TextBlock = apps.get_model('legal_advice_builder', 'TextBlock')
+    text_blocks = TextBlock.objects.order_by('document', 'order', 'id')
+    changed = []
+    document, index = None, 0
+    for text_block in text_blocks:
+        if text_block.document_id != document:
+            document, index = text_block.document_id, 0
+        index += 1
+        text_block.order = index * ORDER_GAP
+        changed.append(text_block)
+    TextBlock.objects.bulk_update(changed, ['order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0012_questionaire_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='textblock',
+            index=models.Index(fields=['document', 'order'], name='legal_advic_documen_bb3029_idx'),
+        ),
+        migrations.RunPython(spread_text_block_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-19 18:11
+
+from django.db import migrations, models
+
+from legal_advice_builder.utils import make_dict_key
+
+
+def fill_dict_keys(apps, schema_editor):
+    Question = apps.get_model('legal_advice_builder', 'Question')
+    questions = list(Question.objects.exclude(questionaire=None).select_related('questionaire'))
+    for question in questions:
+        question.dict_key = make_dict_key(question.questionaire_id, question.questionaire.short_title,
+                                          question.id, question.short_title)
+    Question.objects.bulk_update(questions, ['dict_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0013_textblock_order_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='dict_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=120),
+        ),
+        migrations.RunPython(fill_dict_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0014_question_dict_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['law_case', 'created_at'], name='answer_law_case_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='condition',
+            index=models.Index(fields=['question', 'then_value', 'if_option', 'if_value'], name='condition_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['questionaire', 'path'], name='question_questionaire_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionaire',
+            index=models.Index(fields=['law_case', 'order'], name='questionaire_law_case_idx'),
+        ),
+    ]
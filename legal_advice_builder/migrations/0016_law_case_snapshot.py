@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-19 18:15
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('legal_advice_builder', '0015_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lawcase',
+            name='published_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='LawCaseSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('creator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('law_case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='legal_advice_builder.lawcase')),
+            ],
+            options={
+                'ordering': ['-version'],
+                'unique_together': {('law_case', 'version')},
+            },
+        ),
+    ]
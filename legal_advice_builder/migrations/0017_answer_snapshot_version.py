@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0016_law_case_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
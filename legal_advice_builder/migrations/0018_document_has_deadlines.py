@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+def fill_has_deadlines(apps, schema_editor):
+    Document = apps.get_model('legal_advice_builder', 'Document')
+    TextBlockCondition = apps.get_model('legal_advice_builder', 'TextBlockCondition')
+    Document.objects.update(has_deadlines=models.Exists(TextBlockCondition.objects.filter(
+        text_block__document=models.OuterRef('pk'),
+        if_option__in=['deadline_expired', 'deadline_running'])))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0017_answer_snapshot_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='has_deadlines',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_has_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-19 18:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legal_advice_builder', '0018_document_has_deadlines'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='condition',
+            name='condition_lookup_idx',
+        ),
+    ]
@@ -1,10 +1,39 @@
+import functools
+import tempfile
+
 import weasyprint as wp
+from django.db import IntegrityError
+from django.db import transaction
+from django.http import FileResponse
 from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.template.loader import render_to_string
 
+from .cache import get_cache
+from .cache import has_shared_cache
+from .cache import make_hash
+from .cache import make_key
+from .flow import ModelFlow
 from .models import Answer
-from .models import Question
-from .signals import answer_created
+from .rendering import DOCUMENT_PLACEHOLDER
+from .rendering import stream_template
+from .signals import send_answer_created
+from .snapshot import get_published_law_case
+
+SPOOL_MAX_SIZE = 1024 * 1024
+
+DEFAULT_STYLESHEETS = [
+    'body { font-family: sans-serif !important }',
+    '@page { size: A4; margin: 2cm }',
+    'body { font-size: 14px !important }',
+    'body { line-height: 1.5 !important }'
+]
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_stylesheets():
+    """Returns the default pdf stylesheets, parsed once per process."""
+    return tuple(wp.CSS(string=stylesheet) for stylesheet in DEFAULT_STYLESHEETS)
 
 
 class GenrateFormWizardMixin:
@@ -40,11 +69,50 @@ class GenrateFormWizardMixin:
             return question_data.get('options')
         return question.options
 
+    def get_run_token(self):
+        """Returns the token identifying the current run through the wizard."""
+        if not getattr(self, 'run_token', None):
+            self.run_token = self.storage.get_data().get('run_token')
+        return self.run_token
+
+    def get_snapshot(self):
+        """Returns the published law case the run is pinned to.
+
+        Runs started on an unpublished law case store None as their
+        snapshot version, use the authoring models and get None.
+        """
+        if not hasattr(self, 'snapshot'):
+            version = self.storage.get_data().get('snapshot_version')
+            self.snapshot = get_published_law_case(self.get_lawcase(), version)
+        return self.snapshot
+
+    def get_snapshot_version(self):
+        snapshot = self.get_snapshot()
+        return snapshot.version if snapshot else None
+
+    def get_flow(self):
+        """Returns the flow the run navigates, see flow.Flow."""
+        return self.get_snapshot() or ModelFlow(self.get_lawcase())
+
+    def get_question(self, question_id):
+        return self.get_flow().get_question(question_id)
+
+    def get_first_question(self):
+        return self.get_flow().get_first_question()
+
+    def get_question_status(self, question, option=None, text=None, date=None):
+        return self.get_flow().get_status(question, option=option, text=text, date=date)
+
+    def get_success_message_with_data(self, questionaire, answer):
+        return self.get_flow().success_message_with_data(questionaire, answer)
+
     def render_next(self, question, answers, initial_data=None):
         self.storage.set_data({
             'current_questionaire': question.questionaire.id,
             'current_question': question.id,
-            'answers': answers
+            'answers': answers,
+            'run_token': self.get_run_token(),
+            'snapshot_version': self.get_snapshot_version()
         })
         initial_options = self.get_initial_options(question)
         if not initial_data:
@@ -56,21 +124,15 @@ class GenrateFormWizardMixin:
 
     def get_current_question(self):
         question_id = self.storage.get_data().get('current_question')
-        return Question.objects.get(id=question_id)
+        return self.get_question(question_id)
 
     def get_answer_for_question(self, question_short_title, questionaire_short_title=None):
-        filters = {
-            'short_title': question_short_title
-        }
-        if questionaire_short_title:
-            filters['questionaire__short_title'] = questionaire_short_title
-        questions = Question.objects.filter(**filters)
-        if questions:
-            question_id = questions.first().id
+        question = self.get_flow().find_question(question_short_title, questionaire_short_title)
+        if question:
             answers = self.storage.get_data().get('answers')
             if answers:
                 for answer in answers:
-                    if answer.get('question') == str(question_id):
+                    if answer.get('question') == str(question.id):
                         return answer.get('text') or answer.get('date') or answer.get('option')
         return ""
 
@@ -96,7 +158,8 @@ class GenrateFormWizardMixin:
                                       options=initial_options)
         if question_form.is_valid():
             cleaned_data = question_form.cleaned_data
-            status = question.get_status(
+            status = self.get_question_status(
+                question,
                 option=cleaned_data.get('option'),
                 text=cleaned_data.get('text'),
                 date=cleaned_data.get('date'))
@@ -106,7 +169,9 @@ class GenrateFormWizardMixin:
                 self.storage.set_data({
                     'current_questionaire': question.questionaire.id,
                     'current_question': question.id,
-                    'answers': answers
+                    'answers': answers,
+                    'run_token': self.get_run_token(),
+                    'snapshot_version': self.get_snapshot_version()
                 })
                 return self.render_status(**status)
             elif next_question:
@@ -121,29 +186,62 @@ class GenrateFormWizardMixin:
         return self.render_to_response(context)
 
     def render_done(self, answers=None, **kwargs):
+        if not self.law_case.save_answers:
+            # the document is only displayed, so it is streamed
+            return self.render_html_response(answers, **kwargs)
         context = self.get_template_with_context(answers)
-        if self.law_case.save_answers:
-            answer = self.save_answers(answers)
-            form = self.get_answer_template_form(answer)
-            preview = answer.rendered_document
-            context.update({
-                'answer_form': form,
-                'preview': preview
-            })
+        template = context.get('template')
+        answer = self.get_completed_answer(answers)
+        if not answer:
+            rendered_document = template
+            snapshot = self.get_snapshot()
+            if snapshot and not snapshot.document.has_deadlines:
+                # the document of the snapshot can't change, so it is
+                # rendered again when the answer is opened
+                rendered_document = ''
+            answer = self.save_answers(answers, rendered_document=rendered_document)
+        form = self.get_answer_template_form(answer, template=template)
+        preview = form.initial['rendered_document']
+        context.update({
+            'answer_form': form,
+            'preview': preview
+        })
         return self.render_to_response(context)
 
 
 class GenerateEditableDocumentMixin:
 
-    def save_answers(self, answers):
-        answer = Answer.objects.create(
+    def get_completion_token(self, answers):
+        run_token = self.get_run_token()
+        if run_token:
+            return make_hash(run_token, answers)
+
+    def get_completed_answer(self, answers):
+        """Returns the answer already saved for this run with the same answers."""
+        completion_token = self.get_completion_token(answers)
+        if completion_token:
+            return Answer.objects.filter(
+                law_case=self.get_lawcase(),
+                completion_token=completion_token
+            ).first()
+
+    def save_answers(self, answers, rendered_document=''):
+        answer = Answer(
             law_case=self.get_lawcase(),
             answers=answers,
+            rendered_document=rendered_document or '',
+            completion_token=self.get_completion_token(answers),
+            snapshot_version=self.get_snapshot_version()
         )
-        answer_created.send(sender=answer)
         if self.request.user.is_authenticated:
             answer.creator = self.request.user
-            answer.save()
+        try:
+            with transaction.atomic():
+                answer.save()
+        except IntegrityError:
+            # the same run was completed by a concurrent request
+            return Answer.objects.get(completion_token=answer.completion_token)
+        send_answer_created(answer)
         return answer
 
     def save_document_form(self, data, answer, **kwargs):
@@ -156,7 +254,7 @@ class GenerateEditableDocumentMixin:
         answer_form = self.document_form_class(data=data, instance=answer)
         if answer_form.is_valid():
             answer_form.save()
-        preview = answer.rendered_document
+        preview = answer.get_rendered_document()
         context = self.get_context_data(**kwargs)
         context.update({
             'answer': answer,
@@ -165,10 +263,17 @@ class GenerateEditableDocumentMixin:
         })
         return self.render_to_response(context)
 
-    def get_answer_template_form(self, answer):
-        answer.save_rendered_document()
+    def get_answer_template_form(self, answer, template=None):
+        """Returns the form to edit the answer's document.
+
+        template is the document already rendered with the answers, if any.
+        """
+        if not answer.snapshot_version:
+            answer.save_rendered_document(template=template)
         document_form_class = self.document_form_class
-        return document_form_class(instance=answer)
+        return document_form_class(instance=answer, initial={
+            'rendered_document': answer.get_rendered_document(template=template)
+        })
 
 
 class GeneratePDFDownloadMixin:
@@ -177,36 +282,93 @@ class GeneratePDFDownloadMixin:
         context = self.get_template_with_context(answers)
         return render_to_string(self.download_template_name, context)
 
+    def get_document(self):
+        return self.get_lawcase().document
+
     def get_template_with_context(self, answers, **kwargs):
-        template = self.get_lawcase().document.template_with_answers(answers)
+        template = self.get_document().template_with_answers(answers)
         return self.get_context_data(template=template, **kwargs)
 
     def get_filename(self):
         return 'download.pdf'
 
+    def iter_html_string(self, answers):
+        """Yields the download template with the document rendered in chunks."""
+        context = self.get_context_data(template=DOCUMENT_PLACEHOLDER,
+                                        answer=DOCUMENT_PLACEHOLDER)
+        document = self.get_document()
+        return stream_template(self.download_template_name, context,
+                               document.iter_template_with_answers(answers))
+
+    def render_html_response(self, answers, **kwargs):
+        """Streams the page with the document rendered in chunks."""
+        context = self.get_context_data(template=DOCUMENT_PLACEHOLDER, **kwargs)
+        document = self.get_document()
+        return StreamingHttpResponse(
+            stream_template(self.get_template_names(), context,
+                            document.iter_template_with_answers(answers), request=self.request),
+            content_type='text/html')
+
+    def get_stylesheets(self):
+        return list(get_default_stylesheets())
+
     def get_pdf_bytes(self, html_string):
         doc = wp.HTML(string=html_string)
-        return doc.write_pdf(stylesheets=[
-            wp.CSS(string='body { font-family: sans-serif !important }'),
-            wp.CSS(string='@page { size: A4; margin: 2cm }'),
-            wp.CSS(string='body { font-size: 14px !important }'),
-            wp.CSS(string='body { line-height: 1.5 !important }')
-        ])
+        return doc.write_pdf(stylesheets=self.get_stylesheets())
+
+    def get_cached_pdf_bytes(self, html_string):
+        """Returns the pdf of the html, generated on first access and cached by content.
+
+        Pdfs are only cached in the cache configured with
+        LEGAL_ADVICE_BUILDER_CACHE, the in-process cache is kept for
+        rendered html.
+        """
+        if not has_shared_cache():
+            return self.get_pdf_bytes(html_string)
+        cache = get_cache()
+        cache_key = make_key('pdf', type(self).__qualname__, html_string)
+        pdf = cache.get(cache_key)
+        if pdf is None:
+            pdf = self.get_pdf_bytes(html_string)
+            cache.set(cache_key, pdf)
+        return pdf
+
+    def get_pdf_file(self, html_chunks):
+        """Returns a file with the pdf generated from the html chunks.
+
+        Html and pdf are spooled to temporary files instead of being held
+        in memory as a whole if they get large.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as html_file:
+            for chunk in html_chunks:
+                html_file.write(chunk.encode())
+            html_file.seek(0)
+            pdf_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            wp.HTML(file_obj=html_file, encoding='utf-8').write_pdf(
+                pdf_file, stylesheets=self.get_stylesheets())
+        pdf_file.seek(0)
+        return pdf_file
 
     def render_download_response(self, answers, answer=None):
-        html_string = ''
         if answer:
-            html_string = answer.rendered_document
-        else:
-            html_string = self.get_html_string(answers)
-        return self.generate_pdf_download(html_string)
+            return self.generate_pdf_download(answer.get_rendered_document())
+        return self.generate_streaming_pdf_download(
+            self.iter_html_string(answers))
 
     def generate_pdf_download(self, html_string):
         response = HttpResponse(
-            self.get_pdf_bytes(html_string),
+            self.get_cached_pdf_bytes(html_string),
             content_type='application/pdf'
         )
         filename = self.get_filename()
         attachment = 'attachment; filename="{}"'.format(filename)
         response['Content-Disposition'] = attachment
         return response
+
+    def generate_streaming_pdf_download(self, html_chunks):
+        return FileResponse(
+            self.get_pdf_file(html_chunks),
+            as_attachment=True,
+            filename=self.get_filename(),
+            content_type='application/pdf'
+        )
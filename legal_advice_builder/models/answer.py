@@ -3,12 +3,13 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from legal_advice_builder.utils import CleanHTMLFieldsMixin
 from legal_advice_builder.utils import clean_html_field
 
 from .law_case import LawCase
 
 
-class Answer(models.Model):
+class Answer(CleanHTMLFieldsMixin, models.Model):
     law_case = models.ForeignKey(LawCase, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -18,20 +19,54 @@ class Answer(models.Model):
     rendered_document = models.TextField(blank=True, verbose_name=_('Rendered Document'))
     extra_info = models.JSONField(default=dict, blank=True, null=True)
     external_id = models.IntegerField(blank=True, null=True)
+    completion_token = models.CharField(max_length=64, unique=True,
+                                        blank=True, null=True,
+                                        editable=False)
+    snapshot_version = models.PositiveIntegerField(blank=True, null=True, editable=False)
+
+    clean_html_fields = ['rendered_document']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['law_case', 'created_at'], name='answer_law_case_created_idx')
+        ]
 
     def __str__(self):
         date = str(self.created_at.date())
         return '{} {} ({})'.format(date, self.law_case.title, self.creator)
 
-    def save(self, *args, **kwargs):
-        self.rendered_document = clean_html_field(self.rendered_document)
-        return super().save(*args, **kwargs)
-
-    def save_rendered_document(self):
+    def save_rendered_document(self, template=None):
         if not self.rendered_document:
-            self.rendered_document = self.template
+            self.rendered_document = self.template if template is None else template
             self.save()
 
+    def get_document(self):
+        """Returns the document the answers were given for.
+
+        Answers given on a published law case are rendered with the
+        document of their snapshot, even if the law case was changed since.
+        """
+        if self.snapshot_version:
+            from legal_advice_builder.snapshot import get_published_law_case
+            published = get_published_law_case(self.law_case, self.snapshot_version)
+            if published:
+                return published
+        return self.law_case.document
+
     @property
     def template(self):
-        return self.law_case.document.template_with_answers(self.answers)
+        return self.get_document().template_with_answers(self.answers)
+
+    def get_rendered_document(self, template=None):
+        """Returns the edited document or renders it from the answers on first access.
+
+        template is the document already rendered with the answers, if any.
+        """
+        if self.rendered_document:
+            return self.rendered_document
+        if template is None:
+            document = self.get_document()
+            if document is None:
+                return ''
+            template = document.template_with_answers(self.answers)
+        return clean_html_field(template)
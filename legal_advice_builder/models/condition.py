@@ -1,3 +1,5 @@
+import datetime
+
 from dateutil.relativedelta import relativedelta
 from django.db import models
 from django.utils import timezone
@@ -16,6 +18,16 @@ class AbstractCondition(models.Model):
         return 'if answer {} "{}"'.format(self.if_option,
                                           self.if_value)
 
+    def evaluate_value(self, value):
+        condition_type = self.if_option
+        if condition_type == 'is':
+            if isinstance(value, (list, tuple)):
+                return self.if_value in value
+            return value == self.if_value
+        if isinstance(value, datetime.date):
+            return self.evaluate_date(value)
+        return False
+
     def evaluate_date(self, date):
         condition_type = self.if_option
         if condition_type in ['deadline_expired', 'deadline_running']:
@@ -62,3 +74,11 @@ class TextBlockCondition(AbstractCondition):
     def __str__(self):
         return 'Display textblock if answer "{}" "{}"'.format(self.if_option,
                                                               self.if_value)
+
+    def compile(self):
+        """Returns a predicate evaluated against the answers dict of a document."""
+        key = self.question.get_dict_key()[0]
+
+        def predicate(answers):
+            return self.evaluate_value(answers.get(key))
+        return predicate
@@ -1,27 +1,69 @@
 import datetime
 import json
+import uuid
 
 from django.db import models
-from django.template import Context
-from django.template import Template
+from django.db import transaction
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from django.utils.translation import gettext_lazy as _
 
+from legal_advice_builder.cache import get_cache
+from legal_advice_builder.cache import make_hash
+from legal_advice_builder.cache import make_key
+from legal_advice_builder.rendering import compile_cached
+from legal_advice_builder.rendering import get_answer_keys
+from legal_advice_builder.rendering import get_placeholder_positions
+from legal_advice_builder.rendering import get_renderer
+from legal_advice_builder.rendering import is_self_contained
+from legal_advice_builder.utils import DEADLINE_OPTIONS
+from legal_advice_builder.utils import CleanHTMLFieldsMixin
+from legal_advice_builder.utils import bulk_create_with_pks
 from legal_advice_builder.utils import clean_html_field
+from legal_advice_builder.utils import defer_version_bumps
 from legal_advice_builder.utils import generate_answers_dict_for_template
 
 
 class Document(models.Model):
     name = models.CharField(max_length=200)
     sample_answers = models.JSONField(null=True, default=dict, blank=True)
+    version = models.UUIDField(default=uuid.uuid4, editable=False)
+    has_deadlines = models.BooleanField(default=False, editable=False)
+
+    # set on the documents of published law cases, see snapshot.PublishedLawCase
+    snapshot_version = None
+    published_text_blocks = None
 
     def __str__(self):
         return self.name
 
-    def get_initial_fields_dict(self):
-        '''Used to create vue component in edit mode of document for each textblock'''
+    @classmethod
+    def bump_version(cls, **filters):
+        """Invalidates rendered documents after their textblocks changed.
+
+        Also stores if any textblock has a deadline condition, so the
+        cache key of a rendered document can be built without a query.
+        """
+        from legal_advice_builder.models import TextBlockCondition
+        cls.objects.filter(**filters).update(
+            version=uuid.uuid4(),
+            has_deadlines=models.Exists(TextBlockCondition.objects.filter(
+                text_block__document=models.OuterRef('pk'), if_option__in=DEADLINE_OPTIONS))
+        )
+
+    def reload_version(self):
+        """Loads the version and has_deadlines after the textblocks were changed."""
+        self.version, self.has_deadlines = Document.objects.filter(pk=self.pk).values_list(
+            'version', 'has_deadlines').get()
+
+    def build_initial_fields_dict(self):
+        from legal_advice_builder.models import TextBlockCondition
         initial_data = []
-        for text_block in self.document_text_blocks.all():
+        text_blocks = self.document_text_blocks.prefetch_related(models.Prefetch(
+            'text_block_conditions', queryset=TextBlockCondition.objects.order_by('pk')))
+        for text_block in text_blocks:
             text_block_dict = {
                 'textblock': text_block.id,
                 'content': text_block.content,
@@ -29,18 +71,130 @@ class Document(models.Model):
                 'name': 'name',
                 'question': '',
                 'if_option': '',
-                'if_value': ''
-            }
-            if text_block.text_block_conditions.all():
-                condition = text_block.text_block_conditions.first()
-                text_block_dict.update({
-                    'question': condition.question.id,
+                'if_value': '',
+                'condition_connector': text_block.condition_connector,
+                'conditions': [{
+                    'question': condition.question_id,
                     'if_option': condition.if_option,
                     'if_value': condition.if_value
-                })
+                } for condition in text_block.text_block_conditions.all()]
+            }
+            if text_block_dict['conditions']:
+                # the first condition is the one shown in the editor
+                text_block_dict.update(text_block_dict['conditions'][0])
             initial_data.append(text_block_dict)
         return initial_data
 
+    def get_initial_fields_dict(self):
+        '''Used to create vue component in edit mode of document for each textblock'''
+        cache = get_cache()
+        cache_key = make_key('document_editor', self.id, self.version)
+        initial_data = cache.get(cache_key)
+        if initial_data is None:
+            initial_data = self.build_initial_fields_dict()
+            cache.set(cache_key, initial_data)
+        return initial_data
+
+    def get_submitted_conditions(self, block):
+        """Returns the (question id, if_option, if_value) conditions of a submitted textblock.
+
+        Returns None if the block doesn't submit any conditions.
+        """
+        conditions = block.get('conditions')
+        if conditions is None:
+            if 'question' not in block:
+                return None
+            conditions = [block]
+        return sorted(
+            (int(condition['question']), condition.get('if_option') or 'is', condition['if_value'])
+            for condition in conditions
+            if condition.get('question') and condition.get('if_value')
+        )
+
+    def save_text_blocks(self, blocks):
+        """Saves the complete ordered list of textblocks of the document editor.
+
+        Blocks without id are created, blocks without content and blocks
+        missing in the list are deleted. The conditions and the condition
+        connector of blocks that don't submit them are kept. All changes are
+        applied with bulk queries in one transaction. Returns the saved
+        textblocks in order.
+        """
+        from legal_advice_builder.models import Question
+        from legal_advice_builder.models import TextBlockCondition
+
+        existing = {text_block.id: text_block for text_block in
+                    self.document_text_blocks.prefetch_related('text_block_conditions')}
+        blocks = [block for block in blocks if block.get('content')]
+        submitted_conditions = [self.get_submitted_conditions(block) for block in blocks]
+        question_ids = {condition[0] for conditions in submitted_conditions if conditions
+                        for condition in conditions}
+        if len(Question.objects.in_bulk(question_ids)) != len(question_ids):
+            raise ValueError('Unknown question in textblock conditions.')
+
+        text_blocks, created, updated, replaced = [], [], [], []
+        for index, (block, conditions) in enumerate(zip(blocks, submitted_conditions), start=1):
+            order = index * TextBlock.ORDER_GAP
+            content = clean_html_field(block['content'])
+            if block.get('textblock'):
+                text_block = existing.get(int(block['textblock']))
+                if text_block is None:
+                    raise ValueError('Unknown textblock {}.'.format(block['textblock']))
+                connector = block.get('condition_connector') or text_block.condition_connector
+                if (text_block.content, text_block.order, text_block.condition_connector) != \
+                        (content, order, connector):
+                    text_block.content = content
+                    text_block.order = order
+                    text_block.condition_connector = connector
+                    updated.append(text_block)
+                old_conditions = sorted(
+                    (condition.question_id, condition.if_option, condition.if_value)
+                    for condition in text_block.text_block_conditions.all())
+                if conditions is not None and old_conditions != conditions:
+                    replaced.append(text_block.id)
+            else:
+                connector = block.get('condition_connector') or TextBlock.AND
+                text_block = TextBlock(document=self, content=content, order=order,
+                                       condition_connector=connector)
+                created.append(text_block)
+            text_blocks.append((text_block, conditions))
+
+        kept = {text_block.id for text_block, conditions in text_blocks}
+        deleted = [pk for pk in existing if pk not in kept]
+        # the receivers would bump the version once per deleted row,
+        # it is bumped once at the end instead
+        with transaction.atomic(), defer_version_bumps():
+            TextBlockCondition.objects.filter(text_block__in=deleted + replaced).delete()
+            TextBlock.objects.filter(id__in=deleted).delete()
+            TextBlock.objects.bulk_update(updated, ['content', 'order', 'condition_connector'])
+            bulk_create_with_pks(TextBlock, created)
+            replaced = set(replaced) | {text_block.id for text_block in created}
+            TextBlockCondition.objects.bulk_create([
+                TextBlockCondition(text_block=text_block, question_id=question,
+                                   if_option=if_option, if_value=if_value)
+                for text_block, conditions in text_blocks
+                if text_block.id in replaced and conditions
+                for question, if_option, if_value in conditions
+            ])
+            if deleted or updated or replaced:
+                Document.bump_version(id=self.id)
+                self.reload_version()
+        return [text_block for text_block, conditions in text_blocks]
+
+    def get_next_text_block_order(self):
+        last_order = self.document_text_blocks.aggregate(last_order=models.Max('order'))['last_order']
+        return (last_order or 0) + TextBlock.ORDER_GAP
+
+    def rebalance_text_blocks(self):
+        """Spreads the order of the textblocks evenly, ORDER_GAP apart."""
+        text_blocks = list(self.document_text_blocks.order_by('order', 'id'))
+        changed = []
+        for index, text_block in enumerate(text_blocks, start=1):
+            if text_block.order != index * TextBlock.ORDER_GAP:
+                text_block.order = index * TextBlock.ORDER_GAP
+                changed.append(text_block)
+        TextBlock.objects.bulk_update(changed, ['order'])
+
     @cached_property
     def fields_dict(self):
         return json.dumps(self.get_initial_fields_dict())
@@ -58,28 +212,62 @@ class Document(models.Model):
         )
         return list(questions.values('id', 'text', 'options'))
 
+    def build_placeholder_index(self):
+        keys = {}
+        for text_block_id, content in self.document_text_blocks.values_list('id', 'content'):
+            for key, positions in get_placeholder_positions(content).items():
+                keys.setdefault(key, []).extend(
+                    [text_block_id, start, end] for start, end in positions)
+        condition_questions = self.document_text_blocks.filter(
+            text_block_conditions__isnull=False
+        ).values_list('text_block_conditions__question', flat=True).distinct()
+        return {
+            'keys': keys,
+            'condition_questions': sorted(condition_questions)
+        }
+
+    def get_placeholder_index(self):
+        """Returns the keys used in the textblocks with their positions, cached by document version.
+
+        The positions are [textblock id, start, end] of the key in the
+        textblock's content. Questions only used in textblock conditions
+        are listed in condition_questions.
+        """
+        cache = get_cache()
+        cache_key = make_key('placeholder_index', self.id, self.version)
+        index = cache.get(cache_key)
+        if index is None:
+            index = self.build_placeholder_index()
+            cache.set(cache_key, index)
+        return index
+
+    def get_referenced_questions(self):
+        """Returns the questions whose answers are used in the document."""
+        index = self.get_placeholder_index()
+        condition_questions = set(index['condition_questions'])
+        return [question for key, question in self.lawcase.get_question_key_map().items()
+                if key in index['keys'] or question.id in condition_questions]
+
     def get_initial_questions_dict(self):
         '''Used to display sample answers in preview of document.'''
         initial_data = []
-        answers_questions = [int(answer.get('question')) for answer in self.sample_answers]
-
-        for question in self.questions:
-            if question.get_dict_key()[0] in self.template:
-                if question.id not in answers_questions:
-                    initial_data.append(
-                        {
-                            'question': question.id
-                        }
-                    )
-                else:
-                    index = answers_questions.index(question.id)
-                    answer = self.sample_answers[index]
-                    if 'date' in answer and answer.get('date'):
-                        date = datetime.datetime.strptime(answer.get('date'), '%m.%d.%Y').date()
-                        answer['date'] = date.strftime('%Y-%m-%d')
-                    initial_data.append(
-                        answer
-                    )
+        sample_answers = {int(answer.get('question')): answer for answer in self.sample_answers}
+
+        for question in self.get_referenced_questions():
+            if question.id not in sample_answers:
+                initial_data.append(
+                    {
+                        'question': question.id
+                    }
+                )
+            else:
+                answer = sample_answers[question.id]
+                if 'date' in answer and answer.get('date'):
+                    date = datetime.datetime.strptime(answer.get('date'), '%m.%d.%Y').date()
+                    answer['date'] = date.strftime('%Y-%m-%d')
+                initial_data.append(
+                    answer
+                )
         return initial_data
 
     @cached_property
@@ -87,35 +275,214 @@ class Document(models.Model):
         content = ' '.join([text_field.content_with_condition for text_field in self.document_text_blocks.all()])
         return mark_safe(content)
 
-    def template_with_answers(self, answers):
-        content = ' '.join([text_field.content_with_condition for text_field in self.document_text_blocks.all()])
-        template = Template(mark_safe(content))
-        result = template.render(Context(
-            {'answers': generate_answers_dict_for_template(answers)}
-        ))
+    def get_text_blocks(self):
+        if self.published_text_blocks is not None:
+            return self.published_text_blocks
+        return self.document_text_blocks.prefetch_related(
+            'text_block_conditions__question__questionaire')
+
+    def get_displayed_text_blocks(self, answers_dict):
+        """Returns the textblocks whose conditions apply to the given answers."""
+        return [text_block for text_block in self.get_text_blocks()
+                if text_block.compile_predicate()(answers_dict)]
+
+    def get_cache_key(self, answers_dict):
+        evaluation_date = None
+        if self.has_deadlines:
+            evaluation_date = timezone.now().date()
+        return make_key('document', self.id, self.version, self.snapshot_version, answers_dict,
+                        evaluation_date, get_language())
+
+    def template_with_answers(self, answers, questions=None):
+        """Returns the rendered document, cached for identical answers.
+
+        questions maps the ids of the answered questions to already loaded questions.
+        """
+        answers_dict = generate_answers_dict_for_template(answers, questions=questions)
+        cache = get_cache()
+        cache_key = self.get_cache_key(answers_dict)
+        result = cache.get(cache_key)
+        if result is None:
+            result = self.render_template(answers_dict)
+            cache.set(cache_key, result)
         return result
 
+    def iter_template_with_answers(self, answers, questions=None):
+        """Yields the rendered document in chunks of textblocks.
+
+        The document is cached like template_with_answers once all chunks
+        were rendered.
+        """
+        answers_dict = generate_answers_dict_for_template(answers, questions=questions)
+        cache = get_cache()
+        cache_key = self.get_cache_key(answers_dict)
+        result = cache.get(cache_key)
+        if result is not None:
+            yield result
+            return
+        chunks = []
+        for chunk in self.iter_template(answers_dict):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(cache_key, ''.join(chunks))
+
+    def iter_template(self, answers_dict):
+        renderer = get_renderer()
+        text_blocks = self.get_text_blocks()
+        if not all(text_block.is_self_contained() for text_block in text_blocks):
+            # template tags spanning several textblocks can only be
+            # rendered as a whole document
+            content = ' '.join([text_block.content for text_block in text_blocks
+                                if text_block.compile_predicate()(answers_dict)])
+            yield renderer.render_text(content, answers_dict)
+            return
+        separator = ''
+        for text_block in text_blocks:
+            fragment = text_block.render(answers_dict, renderer)
+            if fragment is not None:
+                yield separator + fragment
+                separator = ' '
+
+    def render_template(self, answers_dict):
+        return ''.join(self.iter_template(answers_dict))
+
     @property
     def template_with_sample_answers(self):
         return self.template_with_answers(self.sample_answers)
 
 
-class TextBlock(models.Model):
+class TextBlock(CleanHTMLFieldsMixin, models.Model):
+
+    AND = 'and'
+    OR = 'or'
+
+    CONDITION_CONNECTORS = [
+        (AND, _('all conditions apply')),
+        (OR, _('at least one condition applies'))
+    ]
+
     document = models.ForeignKey('legal_advice_builder.Document',
                                  related_name='document_text_blocks',
                                  on_delete=models.CASCADE)
     order = models.IntegerField()
     content = models.TextField(default='')
+    condition_connector = models.CharField(
+        max_length=3,
+        choices=CONDITION_CONNECTORS,
+        default=AND
+    )
+
+    clean_html_fields = ['content']
+
+    ORDER_GAP = 1024
+
+    # set on the textblocks of published law cases, see snapshot.PublishedLawCase
+    published_conditions = None
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['document', 'order'])
+        ]
 
     def __str__(self):
         return self.content
 
-    def save(self, *args, **kwargs):
-        self.content = clean_html_field(self.content)
-        return super().save(*args, **kwargs)
+    def get_order_after(self, previous):
+        """Returns an unused order between previous (None for the start) and its successor."""
+        siblings = self.document.document_text_blocks.exclude(pk=self.pk).order_by('order')
+        if previous is None:
+            first = siblings.values_list('order', flat=True).first()
+            return self.ORDER_GAP if first is None else first - self.ORDER_GAP
+        following = siblings.filter(order__gt=previous.order).values_list('order', flat=True).first()
+        if following is None:
+            return previous.order + self.ORDER_GAP
+        if following - previous.order > 1:
+            return (previous.order + following) // 2
+        return None
+
+    def move_after(self, previous=None):
+        """Moves the textblock behind previous, or to the start.
+
+        Only the moved row is updated, unless the gap between the
+        neighbours is used up and the document's textblocks get rebalanced.
+        """
+        with transaction.atomic():
+            order = self.get_order_after(previous)
+            if order is None:
+                self.document.rebalance_text_blocks()
+                previous.refresh_from_db(fields=['order'])
+                order = self.get_order_after(previous)
+            TextBlock.objects.filter(pk=self.pk).update(order=order)
+            Document.bump_version(id=self.document_id)
+        self.order = order
+
+    def get_conditions(self):
+        if self.published_conditions is not None:
+            return self.published_conditions
+        return self.text_block_conditions.all()
+
+    def compile_predicate(self):
+        """Returns a predicate telling if the textblock is displayed for an answers dict."""
+        predicates = [condition.compile() for condition in self.get_conditions()]
+        if not predicates:
+            return lambda answers: True
+        connector = any if self.condition_connector == self.OR else all
+        return lambda answers: connector(predicate(answers) for predicate in predicates)
+
+    def is_self_contained(self):
+        """Tells if the template tags of the textblock don't span other textblocks."""
+        return is_self_contained(self.content)
+
+    def has_deadline_conditions(self):
+        return any(condition.if_option in DEADLINE_OPTIONS
+                   for condition in self.get_conditions())
+
+    def get_dependencies(self):
+        """Returns the keys of the answers dict the textblock depends on.
+
+        Returns None if the textblock uses the answers dict as a whole.
+        """
+        keys = get_answer_keys(self.content)
+        if keys is None:
+            return None
+        keys.update(condition.question.get_dict_key()[0]
+                    for condition in self.get_conditions())
+        return sorted(keys)
+
+    def get_version(self):
+        conditions = [(condition.question_id, condition.if_option, condition.if_value)
+                      for condition in self.get_conditions()]
+        return make_hash(self.content, self.condition_connector, conditions)
+
+    def get_cache_key(self, answers_dict):
+        dependencies = self.get_dependencies()
+        if dependencies is None:
+            values = answers_dict
+        else:
+            values = [(key, answers_dict.get(key)) for key in dependencies]
+        evaluation_date = None
+        if self.has_deadline_conditions():
+            evaluation_date = timezone.now().date()
+        return make_key('text_block', self.id, self.get_version(), values,
+                        evaluation_date, get_language())
+
+    def render(self, answers_dict, renderer=None):
+        """Returns the rendered content or None if the textblock is not displayed.
+
+        Results are cached by the values of the answers the textblock depends on.
+        """
+        cache = get_cache()
+        cache_key = self.get_cache_key(answers_dict)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+        fragment = None
+        if self.compile_predicate()(answers_dict):
+            renderer = renderer or get_renderer()
+            fragment = renderer.render(compile_cached(renderer, self.content), answers_dict)
+        cache.set(cache_key, (fragment,))
+        return fragment
 
     @property
     def content_with_condition(self):
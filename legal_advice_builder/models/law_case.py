@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -20,6 +21,7 @@ class LawCase(models.Model):
                                     null=True,
                                     blank=True,
                                     on_delete=models.SET_NULL)
+    published_version = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.title
@@ -46,6 +48,16 @@ class LawCase(models.Model):
     def questions_count(self):
         return Question.objects.filter(questionaire__law_case=self).count()
 
+    def clone(self, title=None, creator=None):
+        """Returns a copy of the law case, its questionaires, questions and document."""
+        from legal_advice_builder.importer import clone_law_case
+        return clone_law_case(self, title=title, creator=creator or self.creator)
+
+    def publish(self, creator=None):
+        """Saves the current flow, forms and document as a new published snapshot."""
+        from legal_advice_builder.snapshot import publish_law_case
+        return publish_law_case(self, creator=creator)
+
     def generate_default_questionaires(self):
         Questionaire.objects.create(
             law_case=self,
@@ -53,11 +65,30 @@ class LawCase(models.Model):
             order=0
         )
 
+    def get_question_key_map(self):
+        """Returns the questions of the law case by their key in the answers dict."""
+        questions = Question.objects.filter(questionaire__law_case=self)
+        return {question.dict_key: question for question in questions}
+
     @property
     def placeholders_for_template(self):
         """Returns placeholders used in documentform for vue component."""
-        variables = {}
-        questions = Question.objects.filter(questionaire__law_case=self)
-        for question in questions:
-            variables[question.get_dict_key()[0]] = question.text
-        return variables
+        return {key: question.text for key, question in self.get_question_key_map().items()}
+
+
+class LawCaseSnapshot(models.Model):
+    """A published, immutable version of a law case used by the public wizard."""
+    law_case = models.ForeignKey(LawCase, related_name='snapshots',
+                                 on_delete=models.CASCADE)
+    version = models.PositiveIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    creator = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['law_case', 'version']
+        ordering = ['-version']
+
+    def __str__(self):
+        return '{} ({})'.format(self.law_case.title, self.version)
@@ -1,7 +1,24 @@
+from functools import reduce
+from operator import or_
+
+from django.db import connection
 from django.db import models
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Concat
+from django.db.models.functions import Substr
 from django.utils.translation import gettext_lazy as _
 from treebeard.mp_tree import MP_Node
 
+from legal_advice_builder.flow import ModelFlow
+from legal_advice_builder.utils import make_dict_key
+
+from .questionaire import Questionaire
+
 
 class Question(MP_Node):
 
@@ -48,6 +65,12 @@ class Question(MP_Node):
     next_question = models.ForeignKey('legal_advice_builder.Question', null=True, blank=True,
                                       on_delete=models.SET_NULL)
     is_last = models.BooleanField(default=False)
+    dict_key = models.CharField(max_length=120, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['questionaire', 'path'], name='question_questionaire_path_idx')
+        ]
 
     @property
     def conditions(self):
@@ -62,103 +85,102 @@ class Question(MP_Node):
                 'yes': str(_('yes')),
                 'no': str(_('no'))
             }
+        # questions without short_title are keyed by their id, which new
+        # rows only get with the INSERT
+        keyed_by_id = not self.short_title and self.pk is None
+        if not keyed_by_id:
+            self.dict_key = self.build_dict_key()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'dict_key'}
         super().save(*args, **kwargs)
+        if keyed_by_id and self.questionaire_id:
+            self.dict_key = self.build_dict_key()
+            Question.objects.filter(pk=self.pk).update(dict_key=self.dict_key)
+
+    @classmethod
+    def refresh_dict_keys(cls, **filters):
+        """Recomputes the stored dict keys of the filtered questions."""
+        questions = list(cls.objects.filter(**filters).exclude(questionaire=None).only(
+            'id', 'short_title', 'dict_key', 'questionaire'
+        ).select_related('questionaire'))
+        changed = []
+        for question in questions:
+            dict_key = question.build_dict_key()
+            if dict_key != question.dict_key:
+                question.dict_key = dict_key
+                changed.append(question)
+        cls.objects.bulk_update(changed, ['dict_key'], batch_size=500)
+
+    @classmethod
+    def move_subtrees(cls, new_paths, depth_delta):
+        """Moves the subtrees of the given paths to their new paths.
+
+        Runs one UPDATE per batch of subtrees instead of one move() per
+        node. The numchild values of the old and new parents are left to
+        the caller.
+        """
+        items = list(new_paths.items())
+        batch_size = connection.ops.bulk_batch_size(['path'] * 4, items) or len(items)
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            cls.objects.filter(
+                reduce(or_, [Q(path__startswith=path) for path, new_path in batch])
+            ).update(
+                path=Case(*[
+                    When(path__startswith=path,
+                         then=Concat(Value(new_path), Substr('path', len(path) + 1)))
+                    for path, new_path in batch
+                ], default=F('path'), output_field=models.CharField()),
+                depth=F('depth') + depth_delta
+            )
+
+    def move_children(self, target):
+        """Moves all children of the question behind the last child of target."""
+        paths = [path for path in self.get_children().values_list('path', flat=True)
+                 if not target.path.startswith(path)]
+        if not paths:
+            return
+        last_child = target.get_last_child()
+        step = self._str2int(last_child.path[-self.steplen:]) if last_child else 0
+        new_paths = {
+            path: self._get_path(target.path, target.depth + 1, step + index)
+            for index, path in enumerate(paths, start=1)
+        }
+        with transaction.atomic():
+            self.move_subtrees(new_paths, target.depth - self.depth)
+            Question.objects.filter(pk=self.pk).update(numchild=F('numchild') - len(paths))
+            Question.objects.filter(pk=target.pk).update(numchild=F('numchild') + len(paths))
+            Questionaire.bump_version(id=self.questionaire_id)
+        self.numchild -= len(paths)
+        target.numchild += len(paths)
 
     def prepare_for_delete(self):
         if self.is_root():
             child = self.get_children().first()
             if child:
-                new_root = Question.add_root()
-                child.move(new_root, pos='first-child')
-                child.refresh_from_db()
+                last_root = self.get_last_root_node()
+                new_path = self._get_path(None, 1, self._str2int(last_root.path) + 1)
+                with transaction.atomic():
+                    self.move_subtrees({child.path: new_path}, -1)
+                    Question.objects.filter(pk=self.pk).update(numchild=F('numchild') - 1)
+                    Questionaire.bump_version(id=self.questionaire_id)
+                self.numchild -= 1
         else:
-            new_parent = self.get_parent()
-            children = self.get_children()
-            for child in children:
-                child.move(new_parent, pos='last-child')
-                child.refresh_from_db()
+            self.move_children(self.get_parent())
 
     def check_for_success(self, option=None, text=None, date=None):
-        if option or date or text:
-            if self.is_status_by_conditions('success', option, date, text):
-                if self.questionaire.next():
-                    return self.questionaire.next().get_first_question()
-                else:
-                    return None
-            if option or text:
-                conditions = self.conditions.filter(
-                    if_option='is',
-                    if_value__in=[option, text],
-                    then_value='question',
-                    then_question__isnull=False)
-                if conditions:
-                    condition = conditions.first()
-                    return condition.then_question
-        return False
+        return ModelFlow().check_for_success(self, option=option, text=text, date=date)
 
     def next(self, option=None, text=None, date=None):
-        next_by_condition = self.check_for_success(option=option, text=text, date=date)
-        if next_by_condition is not False:
-            return next_by_condition
-        if self.next_question:
-            return self.next_question
-        if self.is_last:
-            if self.questionaire.next():
-                return self.questionaire.next().get_first_question()
-            else:
-                return None
-        if self.get_children():
-            return self.get_children().first()
-        elif self.questionaire.next():
-            return self.questionaire.next().get_first_question()
+        return ModelFlow().get_next(self, option=option, text=text, date=date)
 
     def is_status_by_conditions(self, status, option=None,
                                 date=None, text=None):
-        status_conditions = self.conditions.filter(then_value=status)
-        if status_conditions.exists():
-            if self.field_type in [self.SINGLE_OPTION,
-                                   self.YES_NO, self.TEXT,
-                                   self.SINGLE_LINE] and (option or text):
-                types = [option, text]
-                option_conditions = status_conditions.filter(
-                    if_option='is',
-                    if_value__in=types)
-                if option_conditions.exists():
-                    return option_conditions.first()
-            elif self.field_type == self.DATE and date:
-                date_conditions = status_conditions.filter(
-                    if_option__in=['deadline_expired', 'deadline_running']
-                )
-                for condition in date_conditions:
-                    res = condition.evaluate_date(date)
-                    if res:
-                        return condition
-        return False
+        return ModelFlow().is_status_by_conditions(self, status, option=option,
+                                                   date=date, text=text)
 
     def get_status(self, option=None, text=None, date=None):
-        next = self.next(option, text, date)
-        if option or date or text:
-            condition_success = self.is_status_by_conditions(
-                'success', option=option, date=date, text=text)
-            condition_failure = self.is_status_by_conditions(
-                'failure', option=option, date=date, text=text)
-            if (condition_success or
-               (not next and not condition_failure and not self.questionaire.law_case.document) or
-               (self.is_last and not condition_failure)):
-                return {
-                    'success': True,
-                    'message': self.questionaire.success_message,
-                    'next': next
-                }
-            elif condition_failure:
-                return {
-                    'failure': True,
-                    'message': condition_failure.message,
-                }
-        return {
-            'ongoing': True,
-            'next': next
-        }
+        return ModelFlow().get_status(self, option=option, text=text, date=date)
 
     @property
     def icon(self):
@@ -200,10 +222,13 @@ class Question(MP_Node):
     def get_options_names(self):
         return ', '.join(list(self.options.keys()))
 
+    def build_dict_key(self):
+        if not self.questionaire_id:
+            return ''
+        return make_dict_key(self.questionaire_id, self.questionaire.short_title,
+                             self.id, self.short_title)
+
     def get_dict_key(self, option=None, text=None, date=None):
-        qn = self.questionaire
-        qn_key = qn.short_title if qn.short_title else 'questionaire_{}'.format(qn.id)
-        question_key = self.short_title if self.short_title else 'question_{}'.format(self.id)
         value = ''
         if option:
             if self.field_type in [self.SINGLE_OPTION, self.YES_NO]:
@@ -214,7 +239,7 @@ class Question(MP_Node):
             value = text
         elif date:
             value = date
-        return '{}_{}'.format(qn_key, question_key), value
+        return self.dict_key or self.build_dict_key(), value
 
     def __str__(self):
         return self.text
@@ -1,9 +1,10 @@
+import uuid
+
 from django.db import models
-from django.template import Context
-from django.template import Template
-from django.utils.safestring import mark_safe
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
+from legal_advice_builder.rendering import get_renderer
 from legal_advice_builder.utils import generate_answers_dict_for_template
 
 
@@ -21,12 +22,36 @@ class Questionaire(models.Model):
                                                    'successfully.'))
     unsure_message = models.TextField(blank=True)
     order = models.IntegerField()
+    version = models.UUIDField(default=uuid.uuid4, editable=False)
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['law_case', 'order'], name='questionaire_law_case_idx')
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_short_title = instance.__dict__.get('short_title')
+        return instance
+
+    def save(self, *args, **kwargs):
+        short_title_changed = (not self._state.adding
+                               and self.short_title != getattr(self, '_loaded_short_title', None))
+        super().save(*args, **kwargs)
+        if short_title_changed:
+            from . import Question
+            Question.refresh_dict_keys(questionaire=self)
+        self._loaded_short_title = self.short_title
+
+    @classmethod
+    def bump_version(cls, **filters):
+        """Marks the question flow of the questionaires as changed."""
+        cls.objects.filter(**filters).update(version=uuid.uuid4())
 
     def get_first_question(self):
         return self.questions.first()
@@ -34,23 +59,18 @@ class Questionaire(models.Model):
     def get_last_question(self):
         return self.questions.last()
 
-    def success_message_with_data(self, answer):
-        template = Template(mark_safe(self.success_message))
-        result = template.render(Context(
-            {'answers': generate_answers_dict_for_template(answer.answers)}
-        ))
-        return result
+    def success_message_with_data(self, answer, questions=None):
+        return get_renderer().render_text(
+            self.success_message,
+            generate_answers_dict_for_template(answer.answers, questions=questions))
 
     def add_new_after_question(self, data, parent_question=None):
         from . import Question
         if parent_question:
             question = self.questions.get(id=parent_question)
-            children = question.get_children()
-            new_question = question.add_child(**data)
-            for child in children:
-                if not child == new_question:
-                    child.move(new_question, pos='last-child')
-                    child.refresh_from_db()
+            with transaction.atomic():
+                new_question = question.add_child(**data)
+                question.move_children(new_question)
             return new_question
         else:
             return Question.add_root(**data)
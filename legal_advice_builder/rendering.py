@@ -0,0 +1,192 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import Context
+from django.template import Engine
+from django.template import Template
+from django.template import TemplateSyntaxError
+from django.template.base import render_value_in_context
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+PLACEHOLDER_RE = re.compile(r'{{\s*answers\.([a-zA-Z0-9]\w*)\s*}}')
+DOCUMENT_PLACEHOLDER = mark_safe('<!-- legal_advice_builder:document -->')
+
+TEMPLATE_SYNTAX_RE = re.compile(r'{[{%#]')
+TEMPLATE_TAG_RE = re.compile(r'{[{%](.*?)[}%]}', re.DOTALL)
+ANSWERS_REFERENCE_RE = re.compile(r'\banswers\b(?:\.(\w+))?')
+# answers.items and the like use the answers dict as a whole
+DICT_ATTRIBUTES = frozenset(dir(dict))
+
+
+class UnsupportedSyntax(Exception):
+    pass
+
+
+COMPILED_TEXTS_MAX_SIZE = 1000
+
+# what was computed from the content of textblocks, by kind and content
+compiled_texts = OrderedDict()
+compiled_texts_lock = threading.Lock()
+
+
+class DjangoTemplateRenderer:
+    """Renders texts with the django template engine."""
+
+    def compile(self, text):
+        return Template(mark_safe(text))
+
+    def render(self, compiled, answers_dict):
+        return compiled.render(Context({'answers': answers_dict}))
+
+    def render_text(self, text, answers_dict):
+        return self.render(self.compile(text), answers_dict)
+
+
+class PlaceholderTemplate:
+    """Text precompiled into a flat list of literal and placeholder segments.
+
+    Segments are tuples of ``(literal, key)``; ``key`` is ``None`` for
+    literals and the answers dict key for ``{{ answers.key }}`` placeholders.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def render(self, answers_dict, string_if_invalid=''):
+        context = Context()
+        result = []
+        for literal, key in self.segments:
+            if key is None:
+                result.append(literal)
+            elif key in answers_dict:
+                result.append(render_value_in_context(answers_dict[key], context))
+            else:
+                result.append(string_if_invalid)
+        return ''.join(result)
+
+
+class PlaceholderRenderer(DjangoTemplateRenderer):
+    """Renders texts that only use ``{{ answers.key }}`` placeholders.
+
+    Values are escaped like djangos autoescape does. Texts with any other
+    template syntax are rendered with the django template engine instead.
+    """
+
+    def compile(self, text):
+        try:
+            return self.compile_placeholders(text)
+        except UnsupportedSyntax:
+            return super().compile(text)
+
+    def compile_placeholders(self, text):
+        if Engine.get_default().string_if_invalid:
+            raise UnsupportedSyntax('string_if_invalid is not supported')
+        text = str(text)
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            self._append_literal(segments, text[position:match.start()])
+            segments.append((None, match.group(1)))
+            position = match.end()
+        self._append_literal(segments, text[position:])
+        return PlaceholderTemplate(segments)
+
+    def _append_literal(self, segments, literal):
+        if TEMPLATE_SYNTAX_RE.search(literal):
+            raise UnsupportedSyntax(literal)
+        if literal:
+            segments.append((literal, None))
+
+    def render(self, compiled, answers_dict):
+        if isinstance(compiled, PlaceholderTemplate):
+            return compiled.render(answers_dict)
+        return super().render(compiled, answers_dict)
+
+
+def get_for_text(kind, text, build):
+    """Returns build() for the text, kept in process memory by kind and text.
+
+    The least recently used results are evicted.
+    """
+    key = (kind, text)
+    with compiled_texts_lock:
+        result = compiled_texts.get(key)
+        if result is not None:
+            compiled_texts.move_to_end(key)
+            return result
+    result = build()
+    with compiled_texts_lock:
+        compiled_texts[key] = result
+        while len(compiled_texts) > COMPILED_TEXTS_MAX_SIZE:
+            compiled_texts.popitem(last=False)
+    return result
+
+
+def compile_cached(renderer, text):
+    """Returns the text compiled by the renderer, kept in process memory."""
+    return get_for_text(type(renderer), text, lambda: renderer.compile(text))
+
+
+def is_self_contained(text):
+    """Tells if the template tags of the text don't span other texts, kept in process memory."""
+    if '{%' not in text:
+        return True
+    return get_for_text('self_contained', text, lambda: parses(text))
+
+
+def parses(text):
+    try:
+        Template(text)
+    except TemplateSyntaxError:
+        return False
+    return True
+
+
+def get_placeholder_positions(text):
+    """Returns the answers keys used in the template tags of a text with their (start, end) positions."""
+    positions = {}
+    for tag in TEMPLATE_TAG_RE.finditer(text):
+        for reference in ANSWERS_REFERENCE_RE.finditer(tag.group(1)):
+            if reference.group(1) and reference.group(1) not in DICT_ATTRIBUTES:
+                start, end = reference.span(1)
+                positions.setdefault(reference.group(1), []).append(
+                    (tag.start(1) + start, tag.start(1) + end))
+    return positions
+
+
+def get_answer_keys(text):
+    """Returns the keys of the answers dict referenced in the template tags of a text.
+
+    Returns None if the answers dict is used as a whole, e.g. in a loop
+    over answers or answers.items.
+    """
+    keys = set()
+    for tag in TEMPLATE_TAG_RE.findall(text):
+        for key in ANSWERS_REFERENCE_RE.findall(tag):
+            if not key or key in DICT_ATTRIBUTES:
+                return None
+            keys.add(key)
+    return keys
+
+
+def stream_template(template_name, context, chunks, request=None):
+    """Renders a template and yields the chunks in place of DOCUMENT_PLACEHOLDER."""
+    content = render_to_string(template_name, context, request=request)
+    head, placeholder, tail = content.partition(DOCUMENT_PLACEHOLDER)
+    yield head
+    if placeholder:
+        yield from chunks
+    yield tail
+
+
+def get_renderer():
+    try:
+        renderer_class = import_string(
+            settings.LEGAL_ADVICE_BUILDER_RENDERER)
+    except AttributeError:
+        renderer_class = DjangoTemplateRenderer
+    return renderer_class()
@@ -1,3 +1,92 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import django.dispatch
+from django.conf import settings
+from django.db import connections
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Document
+from .models import LawCase
+from .models import Question
+from .models import Questionaire
+from .models import TextBlock
+from .models import TextBlockCondition
+from .utils import version_bumps_deferred
+
+logger = logging.getLogger(__name__)
 
 answer_created = django.dispatch.Signal()
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        max_workers = getattr(settings, 'LEGAL_ADVICE_BUILDER_SIGNAL_WORKERS', 2)
+        executor = ThreadPoolExecutor(max_workers=max_workers,
+                                      thread_name_prefix='legal_advice_builder')
+    return executor
+
+
+def send_answer_created_in_background(answer):
+    try:
+        for signal_receiver, response in answer_created.send_robust(sender=answer):
+            if isinstance(response, Exception):
+                logger.error('answer_created receiver %s failed', signal_receiver,
+                             exc_info=response)
+    finally:
+        connections.close_all()
+
+
+def send_answer_created(answer):
+    """Sends answer_created once the current transaction is committed.
+
+    With LEGAL_ADVICE_BUILDER_ASYNC_SIGNALS the receivers are run on a
+    thread pool so slow receivers don't delay the response.
+    """
+    def send():
+        if getattr(settings, 'LEGAL_ADVICE_BUILDER_ASYNC_SIGNALS', False):
+            get_executor().submit(send_answer_created_in_background, answer)
+        else:
+            answer_created.send(sender=answer)
+    transaction.on_commit(send)
+
+
+@receiver([post_save, post_delete], sender=TextBlock)
+def text_block_changed(sender, instance, **kwargs):
+    if version_bumps_deferred():
+        return
+    Document.bump_version(id=instance.document_id)
+
+
+@receiver([post_save, post_delete], sender=TextBlockCondition)
+def text_block_condition_changed(sender, instance, **kwargs):
+    if version_bumps_deferred():
+        return
+    Document.bump_version(document_text_blocks=instance.text_block_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    if version_bumps_deferred():
+        return
+    Questionaire.bump_version(id=instance.questionaire_id)
+
+
+@receiver([post_save, post_delete], sender=Questionaire)
+def questionaire_changed(sender, instance, **kwargs):
+    if version_bumps_deferred():
+        return
+    Questionaire.bump_version(law_case=instance.law_case_id)
+
+
+@receiver(post_save, sender=LawCase)
+def law_case_changed(sender, instance, **kwargs):
+    if version_bumps_deferred():
+        return
+    Questionaire.bump_version(law_case=instance.id)
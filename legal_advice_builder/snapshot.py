@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Max
+
+from .cache import get_cache
+from .cache import make_key
+from .exporter import get_export_querysets
+from .flow import Flow
+from .importer import MODELS
+from .models import LawCase
+from .models import LawCaseSnapshot
+from .models import Question
+
+PUBLISHED_LAW_CASES_MAX_SIZE = 32
+
+# published law cases by (law case id, version), snapshots never change
+published_law_cases = OrderedDict()
+published_law_cases_lock = threading.Lock()
+
+
+def serialize_law_case(law_case):
+    """Returns the flow, forms and document of the law case as json data."""
+    records = []
+    for queryset in get_export_querysets(LawCase.objects.filter(pk=law_case.pk)):
+        records.extend(serializers.serialize('python', queryset.iterator()))
+    return {'records': records}
+
+
+def publish_law_case(law_case, creator=None):
+    """Saves a new snapshot of the law case and makes it the published version."""
+    with transaction.atomic():
+        LawCase.objects.select_for_update().filter(pk=law_case.pk).get()
+        last_version = law_case.snapshots.aggregate(last_version=Max('version'))['last_version']
+        snapshot = LawCaseSnapshot.objects.create(
+            law_case=law_case,
+            version=(last_version or 0) + 1,
+            data=serialize_law_case(law_case),
+            creator=creator
+        )
+        LawCase.objects.filter(pk=law_case.pk).update(published_version=snapshot.version)
+    law_case.published_version = snapshot.version
+    return snapshot
+
+
+def build(model, record):
+    """Returns an unsaved instance with the primary and foreign keys of the record."""
+    obj = model(pk=record['pk'])
+    for name, value in record['fields'].items():
+        field = model._meta.get_field(name)
+        if not field.is_relation:
+            value = field.to_python(value)
+        setattr(obj, field.attname, value)
+    return obj
+
+
+class PublishedLawCase(Flow):
+    """A published law case built in memory from its snapshot.
+
+    Runs the navigation of Flow over the objects of the snapshot and
+    renders its document, so a run through the wizard doesn't read the
+    authoring tables.
+    """
+
+    def __init__(self, version, data):
+        self.version = version
+        objects = {label: [] for label in MODELS}
+        for record in data['records']:
+            label = record['model'].lower()
+            objects[label].append(build(MODELS[label], record))
+
+        self.law_case = objects['legal_advice_builder.lawcase'][0]
+        documents = objects['legal_advice_builder.document']
+        self.document = documents[0] if documents else None
+
+        self.questionaires = sorted(objects['legal_advice_builder.questionaire'],
+                                    key=lambda questionaire: (questionaire.order, questionaire.id))
+        questionaires = {questionaire.id: questionaire for questionaire in self.questionaires}
+        self.questionaire_questions = {questionaire.id: [] for questionaire in self.questionaires}
+        for questionaire in self.questionaires:
+            questionaire.law_case = self.law_case
+
+        questions = sorted(objects['legal_advice_builder.question'], key=lambda question: question.path)
+        self.questions = {question.id: question for question in questions}
+        self.children = {}
+        paths = {question.path: question for question in questions}
+        for question in questions:
+            question.questionaire = questionaires[question.questionaire_id]
+            self.questionaire_questions[question.questionaire_id].append(question)
+            parent = paths.get(question.path[:-Question.steplen])
+            if parent:
+                self.children.setdefault(parent.id, []).append(question)
+
+        self.conditions = {}
+        for condition in sorted(objects['legal_advice_builder.condition'],
+                                key=lambda condition: condition.pk):
+            self.conditions.setdefault(condition.question_id, []).append(condition)
+
+        text_block_conditions = {}
+        for condition in sorted(objects['legal_advice_builder.textblockcondition'],
+                                key=lambda condition: condition.pk):
+            condition.question = self.questions[condition.question_id]
+            text_block_conditions.setdefault(condition.text_block_id, []).append(condition)
+        self.text_blocks = sorted(objects['legal_advice_builder.textblock'],
+                                  key=lambda text_block: (text_block.order, text_block.id))
+        for text_block in self.text_blocks:
+            text_block.document = self.document
+            text_block.published_conditions = text_block_conditions.get(text_block.id, [])
+
+        if self.document:
+            self.document.snapshot_version = version
+            self.document.published_text_blocks = self.text_blocks
+            self.document.has_deadlines = any(
+                text_block.has_deadline_conditions() for text_block in self.text_blocks)
+
+    def get_question(self, question_id):
+        try:
+            return self.questions[int(question_id)]
+        except (KeyError, TypeError, ValueError):
+            raise Question.DoesNotExist('Question {} is not published.'.format(question_id))
+
+    def get_questions(self, questionaire):
+        return self.questionaire_questions[questionaire.id]
+
+    def get_first_question(self, questionaire=None):
+        if questionaire is None:
+            questionaire = self.questionaires[0]
+        questions = self.get_questions(questionaire)
+        return questions[0] if questions else None
+
+    def get_next_questionaire(self, questionaire):
+        for next_questionaire in self.questionaires:
+            if next_questionaire.order > questionaire.order:
+                return next_questionaire
+
+    def get_index_of_questionaire(self, questionaire):
+        for index, other in enumerate(self.questionaires):
+            if other.id == questionaire.id:
+                return index
+
+    def questionaire_count(self):
+        return len(self.questionaires)
+
+    def find_question(self, question_short_title, questionaire_short_title=None):
+        for question in self.questions.values():
+            if question.short_title != question_short_title:
+                continue
+            if questionaire_short_title and \
+                    question.questionaire.short_title != questionaire_short_title:
+                continue
+            return question
+
+    def get_question_map(self, answers):
+        return self.questions
+
+    def get_conditions(self, question):
+        return self.conditions.get(question.id, [])
+
+    def get_then_question(self, condition):
+        return self.questions.get(condition.then_question_id)
+
+    def get_next_question(self, question):
+        return self.questions.get(question.next_question_id)
+
+    def get_first_child(self, question):
+        children = self.children.get(question.id)
+        return children[0] if children else None
+
+    def has_document(self, question):
+        return self.document is not None
+
+    def template_with_answers(self, answers):
+        """Returns the published document rendered with the answers, see Document.template_with_answers."""
+        return self.document.template_with_answers(answers, questions=self.questions)
+
+    def iter_template_with_answers(self, answers):
+        return self.document.iter_template_with_answers(answers, questions=self.questions)
+
+
+def get_published_law_case(law_case, version):
+    """Returns the published law case of the version.
+
+    The snapshot is loaded with one query and cached by version, the law
+    case built from it is kept in process memory. Returns None for runs
+    without a version, which use the authoring models.
+    """
+    if not version:
+        return None
+    memo_key = (law_case.id, version)
+    with published_law_cases_lock:
+        published = published_law_cases.get(memo_key)
+        if published is not None:
+            published_law_cases.move_to_end(memo_key)
+            return published
+    cache = get_cache()
+    cache_key = make_key('law_case_snapshot', law_case.id, version)
+    data = cache.get(cache_key)
+    if data is None:
+        data = LawCaseSnapshot.objects.filter(
+            law_case=law_case, version=version).values_list('data', flat=True).first()
+        if data is None:
+            return None
+        cache.set(cache_key, data)
+    published = PublishedLawCase(version, data)
+    with published_law_cases_lock:
+        published_law_cases[memo_key] = published
+        while len(published_law_cases) > PUBLISHED_LAW_CASES_MAX_SIZE:
+            published_law_cases.popitem(last=False)
+    return published
@@ -0,0 +1,16 @@
+function loadFormIntoModal(event) {
+    const button = event.relatedTarget;
+    const modal = event.target;
+    modal.querySelector('.modal-title').textContent = button.getAttribute('data-title');
+    const container = modal.querySelector('.modal-form');
+    container.innerHTML = '';
+    fetch(button.getAttribute('data-form-url'), {credentials: 'same-origin'})
+        .then(response => response.text())
+        .then(html => { container.innerHTML = html; });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-load-form]').forEach(function (modal) {
+        modal.addEventListener('show.bs.modal', loadFormIntoModal);
+    });
+});
@@ -7,6 +7,7 @@ class SessionStorage:
     current_questionaire = 'questionaire_id'
     current_question = 'question_id'
     answers = 'answers'
+    run_token = 'run_token'
 
     def __init__(self, prefix, request=None):
         self.prefix = prefix
@@ -21,6 +22,7 @@ class SessionStorage:
             self.current_questionaire: None,
             self.current_question: None,
             self.answers: [],
+            self.run_token: None,
         }
 
     def get_data(self):
@@ -1,6 +1,10 @@
 import pytest
 from pytest_factoryboy import register
 
+from legal_advice_builder.cache import get_cache
+from legal_advice_builder.rendering import compiled_texts
+from legal_advice_builder.snapshot import published_law_cases
+
 from .factories import AnswerFactory
 from .factories import ConditionFactory
 from .factories import DocumentFactory
@@ -16,6 +20,14 @@ register(LawCaseFactory)
 register(QuestionaireFactory)
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # cache keys contain primary keys, which are reused between tests
+    get_cache().clear()
+    published_law_cases.clear()
+    compiled_texts.clear()
+
+
 @pytest.fixture
 def create_user(db, django_user_model):
     def make_user(**kwargs):
@@ -1,6 +1,8 @@
 import pytest
 from django.utils.timezone import datetime
 
+from legal_advice_builder import utils
+from legal_advice_builder.models import Answer
 from legal_advice_builder.models import Question
 
 from ..helpers import get_text_question
@@ -89,3 +91,40 @@ def test_template(law_case_factory,
     answer.save_rendered_document()
 
     assert answer.rendered_document == 'Mickey Mouse'
+
+
+@pytest.mark.django_db
+def test_save_sanitizes_only_changed_html(monkeypatch, answer_factory):
+
+    answer = answer_factory(rendered_document='<h1>hallo</h1><script>x</script>')
+    assert answer.rendered_document == '<h1>hallo</h1>x'
+
+    cleaned = []
+
+    def clean_html_field(text):
+        cleaned.append(text)
+        return text
+
+    monkeypatch.setattr(utils, 'clean_html_field', clean_html_field)
+
+    answer = Answer.objects.get(id=answer.id)
+    answer.extra_info = {'foo': 'bar'}
+    answer.save()
+    assert cleaned == []
+
+    answer.rendered_document = '<h1>changed</h1>'
+    answer.save(update_fields=['extra_info'])
+    assert cleaned == []
+
+    answer.save()
+    assert cleaned == ['<h1>changed</h1>']
+
+
+def test_clean_html_field_skips_clean_html(monkeypatch):
+
+    html = '<p style="text-align: center;">unchanged <script>x</script></p>'
+    cleaned = utils.clean_html_field(html)
+    assert cleaned == '<p style="text-align: center;">unchanged x</p>'
+
+    monkeypatch.setattr(utils, 'get_cleaner', None)
+    assert utils.clean_html_field(cleaned) == cleaned
@@ -1,7 +1,13 @@
 import pytest
+from freezegun import freeze_time
 
+from legal_advice_builder.cache import get_cache
 from legal_advice_builder.models import Question
+from legal_advice_builder.models import TextBlock
+from legal_advice_builder.models import TextBlockCondition
 
+from ..helpers import get_date_question
+from ..helpers import get_single_option_question
 from ..helpers import get_text_question
 
 
@@ -70,15 +76,15 @@ def test_get_initial_questions_dict(law_case_factory,
 
     tb = text_block_factory(
         document=document,
-        content='{{ qn_1_first_name }}',
+        content='{{ answers.qn_1_first_name }}',
         order=0
     )
 
-    assert str(tb) == '{{ qn_1_first_name }}'
+    assert str(tb) == '{{ answers.qn_1_first_name }}'
 
     text_block_factory(
         document=document,
-        content='{{ qn_1_last_name }} {{ qn_1_city }}',
+        content='{{ answers.qn_1_last_name }} {{ answers.qn_1_city }}',
         order=1
     )
 
@@ -169,3 +175,272 @@ def test_template_with_answers(law_case_factory,
 
     assert document.template_with_answers(answer.answers) == '<p>Mickey</p> Mouse'
     assert document.template_with_sample_answers == '<p>Donald</p> Duck'
+
+
+@pytest.mark.django_db
+def test_template_with_answers_conditions(law_case_factory,
+                                          questionaire_factory,
+                                          text_block_factory,
+                                          document_factory):
+
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(
+        short_title='qn_1',
+        law_case=law_case,
+        order=1
+    )
+    q1 = Question.add_root(
+        **(get_single_option_question(
+            short_title='choice',
+            questionaire=questionaire
+        ))
+    )
+    q2 = q1.add_child(
+        **(get_single_option_question(
+            short_title='choices',
+            questionaire=questionaire
+        ))
+    )
+    q2.field_type = Question.MULTIPLE_OPTIONS
+    q2.save()
+    q3 = q2.add_child(
+        **(get_date_question(
+            questionaire=questionaire
+        ))
+    )
+
+    text_block_factory(document=document, content='always', order=1)
+    tb_and = text_block_factory(document=document, content='and', order=2)
+    tb_or = text_block_factory(document=document, content='or',
+                               order=3, condition_connector=TextBlock.OR)
+    tb_date = text_block_factory(document=document, content='expired', order=4)
+
+    TextBlockCondition.objects.create(text_block=tb_and, question=q1,
+                                      if_option='is', if_value='Yes')
+    TextBlockCondition.objects.create(text_block=tb_and, question=q2,
+                                      if_option='is', if_value='Maybe')
+    TextBlockCondition.objects.create(text_block=tb_or, question=q1,
+                                      if_option='is', if_value='No')
+    TextBlockCondition.objects.create(text_block=tb_or, question=q2,
+                                      if_option='is', if_value='No')
+    TextBlockCondition.objects.create(text_block=tb_date, question=q3,
+                                      if_option='deadline_expired', if_value='months_+3')
+
+    answers = [
+        {'question': str(q1.id), 'option': 'yes'},
+        {'question': str(q2.id), 'option': ['no', 'maybe']},
+        {'question': str(q3.id), 'date': '2020-01-10'}
+    ]
+
+    with freeze_time('2020-05-10'):
+        assert document.template_with_answers(answers) == 'always and or expired'
+
+    answers[1]['option'] = ['yes']
+    answers[2]['date'] = '2020-04-10'
+    with freeze_time('2020-05-10'):
+        assert document.template_with_answers(answers) == 'always'
+
+
+@pytest.mark.django_db
+def test_text_block_render_cache(law_case_factory,
+                                 questionaire_factory,
+                                 text_block_factory,
+                                 document_factory):
+
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(
+        short_title='qn_1',
+        law_case=law_case,
+        order=1
+    )
+    q1 = Question.add_root(
+        **(get_single_option_question(
+            short_title='choice',
+            questionaire=questionaire
+        ))
+    )
+    tb = text_block_factory(
+        document=document,
+        content='<p>{{ answers.qn_1_name }}</p>',
+        order=1
+    )
+    TextBlockCondition.objects.create(text_block=tb, question=q1,
+                                      if_option='is', if_value='Yes')
+
+    tb = document.get_text_blocks().first()
+    assert tb.get_dependencies() == ['qn_1_choice', 'qn_1_name']
+
+    answers = {'qn_1_choice': 'Yes', 'qn_1_name': 'Mickey', 'qn_1_other': 'a'}
+    other_answers = {'qn_1_choice': 'Yes', 'qn_1_name': 'Mickey', 'qn_1_other': 'b'}
+    assert tb.get_cache_key(answers) == tb.get_cache_key(other_answers)
+    assert not tb.get_cache_key(answers) == tb.get_cache_key(
+        {'qn_1_choice': 'No', 'qn_1_name': 'Mickey'})
+
+    assert tb.render(answers) == '<p>Mickey</p>'
+    assert tb.render({'qn_1_choice': 'No', 'qn_1_name': 'Mickey'}) is None
+    assert get_cache().get(tb.get_cache_key(other_answers)) == ('<p>Mickey</p>',)
+
+    for content in ['{% for key in answers %}{{ key }}{% endfor %}',
+                    '{% for key, value in answers.items %}{{ value }}{% endfor %}',
+                    '{{ answers.values|join:"," }}']:
+        tb.content = content
+        assert tb.get_dependencies() is None
+        assert tb.get_cache_key(answers) != tb.get_cache_key(other_answers)
+
+    assert tb.render(answers) == 'Yes,Mickey,a'
+    assert tb.render(other_answers) == 'Yes,Mickey,b'
+
+
+@pytest.mark.django_db
+def test_template_with_answers_tags_spanning_text_blocks(text_block_factory,
+                                                         document_factory):
+
+    document = document_factory()
+    text_block_factory(document=document, order=1, content='{% if True %}<p>a</p>')
+    text_block_factory(document=document, order=2, content='<p>b</p>{% endif %}')
+
+    assert document.template_with_answers([]) == '<p>a</p> <p>b</p>'
+
+
+@pytest.mark.django_db
+def test_template_with_answers_cache(questionaire_factory,
+                                     text_block_factory,
+                                     document_factory):
+
+    document = document_factory()
+    questionaire = questionaire_factory()
+    version = document.version
+    tb = text_block_factory(document=document, order=1, content='<p>a</p>')
+
+    document.reload_version()
+    assert document.template_with_answers([]) == '<p>a</p>'
+    assert not document.version == version
+
+    TextBlock.objects.filter(id=tb.id).update(content='<p>b</p>')
+    document.reload_version()
+    assert document.template_with_answers([]) == '<p>a</p>'
+
+    tb.content = '<p>c</p>'
+    tb.save()
+    document.reload_version()
+    assert document.template_with_answers([]) == '<p>c</p>'
+
+    TextBlockCondition.objects.create(
+        text_block=tb,
+        question=Question.add_root(**get_date_question(questionaire=questionaire)),
+        if_option='deadline_expired',
+        if_value='months_+3'
+    )
+    document.reload_version()
+    assert document.has_deadlines
+    assert document.template_with_answers([]) == ''
+    with freeze_time('2020-05-10'):
+        key = document.get_cache_key({})
+    with freeze_time('2020-05-11'):
+        assert not document.get_cache_key({}) == key
+
+
+@pytest.mark.django_db
+def test_iter_template_with_answers(text_block_factory,
+                                    document_factory):
+
+    document = document_factory()
+    text_block_factory(document=document, order=1, content='<p>a</p>')
+    text_block_factory(document=document, order=2, content='<p>b</p>')
+
+    document.reload_version()
+    assert list(document.iter_template_with_answers([])) == ['<p>a</p>', ' <p>b</p>']
+    assert list(document.iter_template_with_answers([])) == ['<p>a</p> <p>b</p>']
+    assert document.template_with_answers([]) == '<p>a</p> <p>b</p>'
+
+
+@pytest.mark.django_db
+def test_move_text_block_after(document_factory, text_block_factory,
+                               django_assert_num_queries):
+    document = document_factory()
+    tb1, tb2, tb3 = [text_block_factory(document=document, order=document.get_next_text_block_order())
+                     for index in range(3)]
+    assert [tb1.order, tb2.order, tb3.order] == [1024, 2048, 3072]
+
+    with django_assert_num_queries(5):
+        tb3.move_after(tb1)
+    assert list(document.document_text_blocks.all()) == [tb1, tb3, tb2]
+    assert TextBlock.objects.get(id=tb1.id).order == 1024
+    assert TextBlock.objects.get(id=tb2.id).order == 2048
+
+    tb2.move_after(None)
+    assert list(document.document_text_blocks.all()) == [tb2, tb1, tb3]
+    tb2.move_after(tb3)
+    assert list(document.document_text_blocks.all()) == [tb1, tb3, tb2]
+
+
+@pytest.mark.django_db
+def test_move_text_block_rebalances(document_factory, text_block_factory):
+    document = document_factory()
+    tb1 = text_block_factory(document=document, order=1)
+    tb2 = text_block_factory(document=document, order=2)
+    tb3 = text_block_factory(document=document, order=2)
+    version = document.version
+
+    tb3.move_after(tb1)
+    assert list(document.document_text_blocks.order_by('order')) == [tb1, tb3, tb2]
+    assert [text_block.order for text_block in document.document_text_blocks.all()] == [
+        1024, 1536, 2048]
+    document.refresh_from_db()
+    assert document.version != version
+
+
+@pytest.mark.django_db
+def test_get_initial_fields_dict_queries(law_case_factory, questionaire_factory, document_factory,
+                                         text_block_factory, django_assert_num_queries):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(law_case=law_case)
+    question = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    for order in range(10):
+        text_block = text_block_factory(document=document, order=order)
+        TextBlockCondition.objects.create(text_block=text_block, question=question,
+                                          if_option='is', if_value='yes')
+
+    document.reload_version()
+    with django_assert_num_queries(2):
+        initial = document.get_initial_fields_dict()
+    assert len(initial) == 10
+    assert initial[0]['question'] == question.id
+    assert initial[0]['if_value'] == 'yes'
+
+    with django_assert_num_queries(0):
+        assert document.get_initial_fields_dict() == initial
+
+    text_block.content = 'changed'
+    text_block.save()
+    document.reload_version()
+    assert document.get_initial_fields_dict()[-1]['content'] == 'changed'
+
+    with django_assert_num_queries(1):
+        assert len(law_case.placeholders_for_template) == 1
+
+
+@pytest.mark.django_db
+def test_placeholder_index(law_case_factory, questionaire_factory, document_factory,
+                           text_block_factory, django_assert_num_queries):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    qn = questionaire_factory(short_title='qn', law_case=law_case, order=1)
+    q1 = Question.add_root(**get_text_question(short_title='name', questionaire=qn))
+    q2 = q1.add_child(**get_single_option_question(short_title='choice', questionaire=qn))
+    q2.add_child(**get_text_question(short_title='unused', questionaire=qn))
+    tb = text_block_factory(document=document, order=1,
+                            content='<p>{{ answers.qn_name }} and {{ qn_name }}</p>')
+    TextBlockCondition.objects.create(text_block=tb, question=q2, if_value='yes')
+
+    index = document.get_placeholder_index()
+    assert index['keys']['qn_name'] == [[tb.id, 14, 21]]
+    assert index['condition_questions'] == [q2.id]
+    with django_assert_num_queries(0):
+        assert document.get_placeholder_index() == index
+
+    with django_assert_num_queries(1):
+        assert document.get_referenced_questions() == [q1, q2]
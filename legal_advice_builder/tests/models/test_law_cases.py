@@ -1,6 +1,13 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from legal_advice_builder.models import Condition
+from legal_advice_builder.models import Document
+from legal_advice_builder.models import LawCase
 from legal_advice_builder.models import Question
+from legal_advice_builder.models import TextBlockCondition
+from legal_advice_builder.snapshot import get_published_law_case
 
 from ..helpers import get_date_question
 from ..helpers import get_single_option_question
@@ -185,3 +192,110 @@ def test_placeholders_for_template_with_short_titles(law_case_factory, questiona
     assert q2_2_string in variables.keys()
     assert variables[q2_2_string] == Question.objects.get(id=q2_2.id).text
     assert len(variables.keys()) == 4
+
+
+def create_questions(questionaire, children):
+    root = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    previous = root
+    for index in range(children):
+        child = previous.add_child(**get_text_question(questionaire=questionaire))
+        Condition.objects.create(question=previous, if_option='is', if_value='yes',
+                                 then_value='question', then_question=child)
+        previous = child
+    return root
+
+
+@pytest.mark.django_db
+def test_clone(law_case_factory, questionaire_factory, document_factory,
+               text_block_factory, admin_user):
+    document = document_factory()
+    law_case = law_case_factory(document=document, slug='law-case')
+    questionaire = questionaire_factory(law_case=law_case, short_title='qn')
+    root = create_questions(questionaire, 2)
+    text_block = text_block_factory(document=document, order=1,
+                                    content='<p>{{ answers.qn_name }}</p>')
+    TextBlockCondition.objects.create(text_block=text_block, question=root,
+                                      if_option='is', if_value='yes')
+
+    clone = law_case.clone(title='Copy', creator=admin_user)
+    assert clone.id != law_case.id
+    assert clone.title == 'Copy'
+    assert clone.creator == admin_user
+    assert clone.slug is None
+    assert clone.document.id != document.id
+    assert clone.document.version != document.version
+    assert Question.find_problems() == ([], [], [], [], [])
+
+    cloned_questionaire = clone.questionaire_set.get()
+    assert cloned_questionaire.short_title == 'qn'
+    cloned_root = Question.get_root_nodes().get(questionaire=cloned_questionaire)
+    cloned_child = cloned_root.get_children().get()
+    assert cloned_root.question_condition.get().then_question == cloned_child
+    cloned_block = clone.document.document_text_blocks.get()
+    assert cloned_block.content == text_block.content
+    assert cloned_block.text_block_conditions.get().question == cloned_root
+    assert law_case.questions_count() == clone.questions_count() == 3
+
+
+@pytest.mark.django_db
+def test_clone_remaps_sample_answers(law_case_factory, questionaire_factory, document_factory,
+                                     text_block_factory):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(law_case=law_case, short_title='qn')
+    root = Question.add_root(**get_text_question(questionaire=questionaire, short_title='name'))
+    text_block_factory(document=document, order=1,
+                       content='<p>{{ answers.qn_name }}</p>')
+    document.sample_answers = [{'question': str(root.id), 'text': 'Mickey'}]
+    document.save()
+
+    clone = law_case.clone()
+    root.delete()
+    clone_document = Document.objects.get(id=clone.document.id)
+    cloned_root = Question.get_root_nodes().get(questionaire__law_case=clone)
+    assert clone_document.sample_answers == [{'question': str(cloned_root.id), 'text': 'Mickey'}]
+    assert clone_document.template_with_sample_answers == '<p>Mickey</p>'
+    assert clone_document.get_initial_questions_dict()[0]['question'] == str(cloned_root.id)
+
+
+@pytest.mark.django_db
+def test_clone_query_count(law_case_factory, questionaire_factory, document_factory):
+    counts = []
+    for size in [1, 5]:
+        law_case = law_case_factory(document=document_factory())
+        for order in range(size):
+            questionaire = questionaire_factory(law_case=law_case, order=order)
+            create_questions(questionaire, size)
+        with CaptureQueriesContext(connection) as context:
+            law_case.clone()
+        counts.append(len(context.captured_queries))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_publish(law_case_factory, questionaire_factory, document_factory, text_block_factory,
+                 django_assert_num_queries):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    qn = questionaire_factory(law_case=law_case, short_title='qn', order=1)
+    q1 = Question.add_root(**get_text_question(questionaire=qn, short_title='name'))
+    text_block = text_block_factory(document=document, order=1, content='<p>{{ answers.qn_name }}</p>')
+    law_case.publish()
+
+    text_block.content = '<p>changed</p>'
+    text_block.save()
+    with django_assert_num_queries(1):
+        published = get_published_law_case(law_case, law_case.published_version)
+    with django_assert_num_queries(0):
+        assert get_published_law_case(law_case, 1) is published
+        assert published.get_first_question().id == q1.id
+        assert published.find_question('name', 'qn').id == q1.id
+        assert published.find_question('name', 'other') is None
+        assert published.template_with_answers([{'question': str(q1.id), 'text': 'Mickey'}]) == \
+            '<p>Mickey</p>'
+
+    law_case.publish()
+    assert LawCase.objects.get(id=law_case.id).published_version == 2
+    assert get_published_law_case(law_case, 2).template_with_answers([]) == '<p>changed</p>'
+    assert get_published_law_case(law_case, 1).version == 1
+    assert get_published_law_case(law_case, None) is None
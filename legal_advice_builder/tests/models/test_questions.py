@@ -1,10 +1,13 @@
 import datetime
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
 from legal_advice_builder.models import Condition
 from legal_advice_builder.models import Question
+from legal_advice_builder.models import Questionaire
 
 from ..helpers import get_date_question
 from ..helpers import get_single_option_question
@@ -346,3 +349,54 @@ def test_string():
     q1.field_type = q1.TEXT
     q1.save()
     assert str(q1) == 'test'
+
+
+@pytest.mark.django_db
+def test_prepare_for_delete_moves_children_in_bulk(django_assert_num_queries):
+    root = Question.add_root(**get_text_question())
+    question = root.add_child(**get_text_question())
+    children = [question.add_child(**get_text_question()) for i in range(300)]
+    children[0].add_child(**get_text_question())
+    sibling = root.add_child(**get_text_question())
+
+    question.refresh_from_db()
+    with django_assert_num_queries(9):
+        question.prepare_for_delete()
+    question.delete()
+
+    assert Question.find_problems() == ([], [], [], [], [])
+    assert list(root.get_children()) == [sibling] + children
+    assert Question.objects.get(id=children[0].id).get_children().count() == 1
+
+    root.refresh_from_db()
+    root.prepare_for_delete()
+    root.delete()
+    assert Question.find_problems() == ([], [], [], [], [])
+    assert Question.objects.get(id=sibling.id).is_root()
+
+
+@pytest.mark.django_db
+def test_dict_key_is_stored(law_case_factory, questionaire_factory, django_assert_num_queries):
+    law_case = law_case_factory()
+    qn = questionaire_factory(law_case=law_case, short_title='', order=1)
+    q_1 = Question.add_root(**get_text_question(questionaire=qn, short_title='name'))
+    q_2 = q_1.add_child(**get_text_question(questionaire=qn, short_title=''))
+    assert Question.objects.get(id=q_1.id).dict_key == 'questionaire_{}_name'.format(qn.id)
+    assert Question.objects.get(id=q_2.id).dict_key == 'questionaire_{}_question_{}'.format(qn.id, q_2.id)
+
+    qn = Questionaire.objects.get(id=qn.id)
+    qn.short_title = 'person'
+    qn.save()
+    q_1 = Question.objects.get(id=q_1.id)
+    with django_assert_num_queries(0):
+        assert q_1.get_dict_key('', 'Mickey') == ('person_name', 'Mickey')
+    assert Question.objects.get(id=q_2.id).dict_key == 'person_question_{}'.format(q_2.id)
+    assert law_case.get_question_key_map() == {'person_name': q_1, 'person_question_{}'.format(q_2.id): q_2}
+
+    question = Question(questionaire=qn, short_title='age', path='0009', depth=1,
+                        text='How old are you?', field_type=Question.SINGLE_LINE)
+    with CaptureQueriesContext(connection) as context:
+        question.save()
+    assert not [query for query in context.captured_queries
+                if query['sql'].startswith('UPDATE "legal_advice_builder_question"')]
+    assert Question.objects.get(id=question.id).dict_key == 'person_age'
@@ -0,0 +1,219 @@
+import gzip
+import io
+import json
+import threading
+
+import pytest
+from django.contrib import admin
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+
+from legal_advice_builder import importer
+from legal_advice_builder.admin import LawcaseAdmin
+from legal_advice_builder.exporter import get_export_querysets
+from legal_advice_builder.exporter import iter_export_json
+from legal_advice_builder.importer import LawCaseImportError
+from legal_advice_builder.importer import import_law_cases
+from legal_advice_builder.importer import iter_fixture_objects
+from legal_advice_builder.models import Condition
+from legal_advice_builder.models import LawCase
+from legal_advice_builder.models import Question
+from legal_advice_builder.models import TextBlockCondition
+from legal_advice_builder.snapshot import get_published_law_case
+from legal_advice_builder.warmup import WARMUP_DISPATCH_UID
+from legal_advice_builder.warmup import warm_caches_on_first_request
+
+from .helpers import get_single_option_question
+
+
+def create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(law_case=law_case, order=1)
+    q1 = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    q2 = q1.add_child(**get_single_option_question(questionaire=questionaire))
+    q2.add_child(**get_single_option_question(questionaire=questionaire))
+    Condition.objects.create(question=q1, if_option='is', if_value='yes',
+                             then_value='question', then_question=q2)
+    text_block = text_block_factory(document=document, order=1)
+    TextBlockCondition.objects.create(text_block=text_block, question=q1,
+                                      if_option='is', if_value='Yes')
+    return law_case
+
+
+@pytest.mark.django_db
+def test_export_lawcase(rf, law_case_factory, questionaire_factory,
+                        document_factory, text_block_factory):
+    create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory)
+    create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory)
+
+    lawcases = LawCase.objects.all()
+    expected = json.loads(serializers.serialize('json', [
+        obj for queryset in get_export_querysets(lawcases) for obj in queryset]))
+
+    model_admin = LawcaseAdmin(LawCase, admin.site)
+    response = model_admin.export_lawcase(rf.get('/'), lawcases)
+    assert response.streaming
+    exported = json.loads(b''.join(response.streaming_content))
+    assert exported == expected
+    assert len(exported) == 2 * 9
+
+    response = model_admin.export_lawcase_gzip(rf.get('/'), lawcases)
+    assert response['content-type'] == 'application/gzip'
+    assert json.loads(gzip.decompress(b''.join(response.streaming_content))) == expected
+
+
+def export_law_cases(lawcases):
+    return ''.join(iter_export_json(get_export_querysets(lawcases))).encode()
+
+
+def test_iter_fixture_objects():
+    data = [{'model': 'a', 'pk': index, 'fields': {'text': '[{]}, "'}}
+            for index in range(20)]
+    stream = io.StringIO(json.dumps(data))
+    assert list(iter_fixture_objects(stream, chunk_size=7)) == data
+    assert list(iter_fixture_objects(io.StringIO(' [ ] '))) == []
+    with pytest.raises(LawCaseImportError):
+        list(iter_fixture_objects(io.StringIO(json.dumps(data)[:-20]), chunk_size=7))
+    with pytest.raises(LawCaseImportError):
+        list(iter_fixture_objects(io.StringIO('{}')))
+
+
+@pytest.mark.django_db
+def test_import_law_cases(law_case_factory, questionaire_factory,
+                          document_factory, text_block_factory):
+    create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory)
+    law_case = create_law_case(law_case_factory, questionaire_factory,
+                               document_factory, text_block_factory)
+    source_root = Question.get_root_nodes().get(questionaire__law_case=law_case)
+    law_case.document.sample_answers = [{'question': str(source_root.id), 'option': 'yes'},
+                                        {'question': '0', 'option': 'gone'}]
+    law_case.document.save()
+    export = export_law_cases(LawCase.objects.all())
+
+    imported = import_law_cases(io.BytesIO(gzip.compress(export)))
+    assert len(imported) == 2
+    assert LawCase.objects.count() == 4
+    assert Question.find_problems() == ([], [], [], [], [])
+    assert Question.get_root_nodes().count() == 4
+
+    copy = imported[1]
+    assert copy.id != law_case.id
+    assert copy.title == law_case.title
+    assert copy.document.id != law_case.document.id
+    questionaire = copy.questionaire_set.get()
+    root = Question.get_root_nodes().get(questionaire=questionaire)
+    child = root.get_children().get()
+    assert child.get_children().get().questionaire == questionaire
+    condition = Condition.objects.get(question=root)
+    assert condition.then_question == child
+    text_block = copy.document.document_text_blocks.get()
+    assert text_block.text_block_conditions.get().question == root
+    assert copy.document.sample_answers == [{'question': str(root.id), 'option': 'yes'}]
+    assert isinstance(copy.document.template_with_sample_answers, str)
+
+    assert len(import_law_cases(io.BytesIO(export))) == 2
+    assert LawCase.objects.count() == 6
+    assert Question.find_problems() == ([], [], [], [], [])
+
+
+@pytest.mark.django_db
+def test_import_law_cases_invalid_records(law_case_factory, questionaire_factory,
+                                          document_factory, text_block_factory, monkeypatch):
+    create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory)
+    records = json.loads(export_law_cases(LawCase.objects.all()))
+
+    def import_records(records):
+        return import_law_cases(io.BytesIO(json.dumps(records).encode()))
+
+    for change in [
+        lambda record: record['fields'].pop('path'),
+        lambda record: record['fields'].update(unknown=1),
+        lambda record: record['fields'].update(is_last='maybe'),
+        lambda record: record['fields'].update(text=None),
+    ]:
+        changed = json.loads(json.dumps(records))
+        change(next(record for record in changed
+                    if record['model'] == 'legal_advice_builder.question'))
+        with pytest.raises(LawCaseImportError):
+            import_records(changed)
+    with pytest.raises(LawCaseImportError):
+        import_records(records + ['question'])
+
+    changed = json.loads(json.dumps(records))
+    next(record for record in changed if record['model'] == 'legal_advice_builder.document')[
+        'fields']['sample_answers'] = [{'question': 'first'}]
+    with pytest.raises(LawCaseImportError):
+        import_records(changed)
+
+    def bulk_create_with_pks(model, objects, batch_size=None):
+        raise RuntimeError('{} rows were inserted concurrently.'.format(model.__name__))
+
+    monkeypatch.setattr(importer, 'bulk_create_with_pks', bulk_create_with_pks)
+    with pytest.raises(LawCaseImportError):
+        import_records(records)
+    assert LawCase.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_lawcases_command(tmp_path, law_case_factory, questionaire_factory,
+                                 document_factory, text_block_factory):
+    create_law_case(law_case_factory, questionaire_factory,
+                    document_factory, text_block_factory)
+    path = tmp_path / 'export.json'
+    path.write_bytes(export_law_cases(LawCase.objects.all()))
+    call_command('import_lawcases', str(path), stdout=io.StringIO())
+    assert LawCase.objects.count() == 2
+
+    path.write_text(json.dumps([{'model': 'auth.user', 'pk': 1, 'fields': {}}]))
+    with pytest.raises(CommandError):
+        call_command('import_lawcases', str(path))
+    assert LawCase.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_warm_caches_command(law_case_factory, questionaire_factory, document_factory,
+                             text_block_factory, django_assert_num_queries):
+    law_case = create_law_case(law_case_factory, questionaire_factory,
+                               document_factory, text_block_factory)
+    law_case.publish()
+    law_case_factory(title='Unused')
+
+    out = io.StringIO()
+    call_command('warm_caches', str(law_case.id), '--workers', '1', stdout=out)
+    assert 'Warmed {} ({}) in'.format(law_case.title, law_case.id) in out.getvalue()
+    assert 'Unused' not in out.getvalue()
+
+    law_case = LawCase.objects.select_related('document').get(id=law_case.id)
+    with django_assert_num_queries(0):
+        get_published_law_case(law_case, law_case.published_version)
+    with django_assert_num_queries(0):
+        law_case.document.get_placeholder_index()
+
+
+@pytest.mark.django_db
+def test_warm_caches_on_first_request(monkeypatch):
+    warmed = []
+    done = threading.Event()
+
+    def warm_caches_in_background():
+        warmed.append(threading.current_thread().name)
+        done.set()
+
+    monkeypatch.setattr('legal_advice_builder.warmup.warm_caches_in_background',
+                        warm_caches_in_background)
+    request_started.connect(warm_caches_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
+    assert warmed == []
+
+    request_started.send(sender=None)
+    request_started.send(sender=None)
+    assert done.wait(5)
+    assert warmed == ['legal_advice_builder_warmup']
+    assert not request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID)
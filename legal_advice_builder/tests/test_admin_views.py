@@ -13,6 +13,7 @@ from legal_advice_builder.admin_views import LawCaseList
 from legal_advice_builder.admin_views import LawCasePreview
 from legal_advice_builder.admin_views import QuestionaireDeleteView
 from legal_advice_builder.admin_views import QuestionaireDetail
+from legal_advice_builder.admin_views import QuestionaireQuestions
 from legal_advice_builder.admin_views import QuestionDelete
 from legal_advice_builder.admin_views import QuestionUpdate
 from legal_advice_builder.models import Answer
@@ -22,6 +23,7 @@ from legal_advice_builder.models import LawCase
 from legal_advice_builder.models import Question
 from legal_advice_builder.models import Questionaire
 from legal_advice_builder.models import TextBlock
+from legal_advice_builder.models import TextBlockCondition
 from legal_advice_builder.views import PdfDownloadView
 
 from .helpers import get_single_option_question
@@ -40,12 +42,12 @@ def test_document_preview_view(rf, document_factory, law_case_factory,
 
     text_block_factory(
         document=document,
-        content='<p>{{ qn_q1 }}</p>'
+        content='<p>{{ answers.qn_q1 }}</p>'
     )
 
     text_block_factory(
         document=document,
-        content='<p>{{ qn_q2 }}</p>'
+        content='<p>{{ answers.qn_q2 }}</p>'
     )
 
     law_case = law_case_factory(document=document)
@@ -114,7 +116,107 @@ def test_document_form_view(rf, document_factory,
 
 
 @pytest.mark.django_db
-def test_pdf_download_view(rf, answer_factory):
+def test_document_form_view_saves_text_blocks(rf, document_factory, law_case_factory,
+                                              questionaire_factory, text_block_factory,
+                                              django_assert_num_queries):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(law_case=law_case)
+    question = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    tb1 = text_block_factory(document=document, order=1, content='<p>one</p>')
+    tb2 = text_block_factory(document=document, order=2, content='<p>two</p>')
+    tb3 = text_block_factory(document=document, order=3, content='<p>three</p>')
+    TextBlockCondition.objects.create(text_block=tb2, question=question,
+                                      if_option='is', if_value='yes')
+    version = Document.objects.get(id=document.id).version
+
+    data = {'textblocks': [
+        {'textblock': '', 'content': '<p>new</p><script>x</script>',
+         'question': question.id, 'if_option': 'is', 'if_value': 'no'},
+        {'textblock': tb3.id, 'content': '<p>three</p>'},
+        {'textblock': tb1.id, 'content': '<p>one</p>',
+         'conditions': [{'question': question.id, 'if_value': 'yes'}]},
+        {'textblock': tb2.id, 'content': ''},
+    ]}
+    request = rf.post('/', json.dumps(data), content_type='application/json')
+    with django_assert_num_queries(19):
+        response = DocumentFormView.as_view()(request, pk=law_case.id)
+    result = json.loads(response.content)['textblocks']
+    assert [block['id'] for block in result][1:] == [tb3.id, tb1.id]
+    assert result[0]['content'] == '<p>new</p>x'
+
+    text_blocks = list(document.document_text_blocks.all())
+    assert [text_block.id for text_block in text_blocks] == [block['id'] for block in result]
+    assert [(c.if_value, c.question) for c in text_blocks[0].text_block_conditions.all()] == [
+        ('no', question)]
+    assert not text_blocks[1].text_block_conditions.exists()
+    assert text_blocks[2].text_block_conditions.get().if_value == 'yes'
+    assert not TextBlockCondition.objects.filter(if_value='yes', text_block_id=tb2.id).exists()
+    assert Document.objects.get(id=document.id).version != version
+
+    data = {'textblock': tb1.id, 'move_after': ''}
+    request = rf.post('/', json.dumps(data), content_type='application/json')
+    response = DocumentFormView.as_view()(request, pk=law_case.id)
+    assert json.loads(response.content)['id'] == tb1.id
+    assert document.document_text_blocks.first() == tb1
+
+    other = text_block_factory(document=document_factory(), order=1)
+    for data in [{'textblock': other.id, 'move_after': ''},
+                 {'textblock': tb1.id, 'move_after': other.id},
+                 {'textblock': 'first', 'move_after': ''}]:
+        request = rf.post('/', json.dumps(data), content_type='application/json')
+        response = DocumentFormView.as_view()(request, pk=law_case.id)
+        assert response.status_code == 400
+
+    data = {'textblocks': [{'textblock': tb2.id, 'content': '<p>x</p>'}]}
+    request = rf.post('/', json.dumps(data), content_type='application/json')
+    response = DocumentFormView.as_view()(request, pk=law_case.id)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_document_form_view_round_trip_keeps_conditions(rf, document_factory, law_case_factory,
+                                                        questionaire_factory, text_block_factory):
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(law_case=law_case)
+    q1 = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    q2 = q1.add_child(**get_single_option_question(questionaire=questionaire))
+    tb = text_block_factory(document=document, order=1, content='<p>one</p>',
+                            condition_connector=TextBlock.OR)
+    TextBlockCondition.objects.create(text_block=tb, question=q1, if_option='is', if_value='yes')
+    TextBlockCondition.objects.create(text_block=tb, question=q2, if_option='is', if_value='no')
+
+    def get_conditions():
+        text_block = TextBlock.objects.get(id=tb.id)
+        return text_block.condition_connector, sorted(
+            (c.question_id, c.if_value) for c in text_block.text_block_conditions.all())
+
+    expected = (TextBlock.OR, sorted([(q1.id, 'yes'), (q2.id, 'no')]))
+    fields = document.get_initial_fields_dict()
+    assert fields[0]['condition_connector'] == TextBlock.OR
+    assert len(fields[0]['conditions']) == 2
+
+    # posted back like the document editor does
+    data = {'textblocks': [{
+        'textblock': field['textblock'],
+        'content': '<p>changed</p>',
+        'conditions': field['conditions'],
+        'condition_connector': field['condition_connector']
+    } for field in fields]}
+    request = rf.post('/', json.dumps(data), content_type='application/json')
+    DocumentFormView.as_view()(request, pk=law_case.id)
+    assert get_conditions() == expected
+
+    data = {'textblocks': [{'textblock': tb.id, 'content': '<p>again</p>'}]}
+    request = rf.post('/', json.dumps(data), content_type='application/json')
+    DocumentFormView.as_view()(request, pk=law_case.id)
+    assert TextBlock.objects.get(id=tb.id).content == '<p>again</p>'
+    assert get_conditions() == expected
+
+
+@pytest.mark.django_db
+def test_pdf_download_view(rf, answer_factory, settings):
 
     class TestPdfDownloadWithoutAnswerView(PdfDownloadView):
         pass
@@ -132,6 +234,24 @@ def test_pdf_download_view(rf, answer_factory):
     pdf_response = TestPdfDownloadView.as_view()(request)
     assert pdf_response['content-type'] == 'application/pdf'
 
+    generated = []
+
+    class TestCountingPdfDownloadView(TestPdfDownloadView):
+
+        def get_pdf_bytes(self, html_string):
+            generated.append(html_string)
+            return super().get_pdf_bytes(html_string)
+
+    TestCountingPdfDownloadView.as_view()(request)
+    TestCountingPdfDownloadView.as_view()(request)
+    assert len(generated) == 2
+
+    settings.LEGAL_ADVICE_BUILDER_CACHE = 'default'
+    TestCountingPdfDownloadView.as_view()(request)
+    pdf_response = TestCountingPdfDownloadView.as_view()(request)
+    assert pdf_response['content-type'] == 'application/pdf'
+    assert len(generated) == 3
+
 
 @pytest.mark.django_db
 def test_law_case_list_view(rf, law_case_factory):
@@ -140,7 +260,7 @@ def test_law_case_list_view(rf, law_case_factory):
 
     request = rf.get('/')
     view_response = LawCaseList.as_view()(request)
-    assert len(view_response.context_data.get('update_forms')) == 2
+    assert len(view_response.context_data.get('object_list')) == 2
 
     LawCase.objects.all().count() == 2
 
@@ -154,6 +274,42 @@ def test_law_case_list_view(rf, law_case_factory):
     LawCase.objects.all().count() == 3
 
 
+@pytest.mark.django_db
+def test_law_case_list_view_counts(rf, law_case_factory, questionaire_factory,
+                                   answer_factory, django_assert_num_queries):
+    for index in range(3):
+        law_case = law_case_factory(title='Case {}'.format(index))
+        questionaire = questionaire_factory(law_case=law_case, order=1)
+        questionaire_factory(law_case=law_case, order=2)
+        Question.add_root(**get_text_question(questionaire=questionaire))
+        answer_factory(law_case=law_case)
+    questionaire_factory(law_case=law_case_factory(title='Other', description='no questions yet'))
+
+    request = rf.get('/')
+    with django_assert_num_queries(2):
+        response = LawCaseList.as_view()(request)
+        response.render()
+    law_cases = response.context_data['object_list']
+    assert [law_case.title for law_case in law_cases] == ['Case 0', 'Case 1', 'Case 2', 'Other']
+    assert [(law_case.questionaire_count, law_case.question_count, law_case.answer_count)
+            for law_case in law_cases] == [(2, 1, 1)] * 3 + [(1, 0, 0)]
+    assert law_cases[0].first_questionaire_id == law_cases[0].questionaire_set.first().id
+
+    request = rf.get('/', {'q': 'questions'})
+    response = LawCaseList.as_view()(request)
+    assert [law_case.title for law_case in response.context_data['object_list']] == ['Other']
+
+
+@pytest.mark.django_db
+def test_law_case_edit_form_fragment(rf, law_case_factory):
+    law_case = law_case_factory(title='Case')
+    request = rf.get('/')
+    response = LawCaseEdit.as_view()(request, pk=law_case.id)
+    response.render()
+    assert b'value="Case"' in response.content
+    assert b'<html' not in response.content
+
+
 @pytest.mark.django_db
 def test_law_case_preview_view(rf, law_case_factory, questionaire_factory):
     law_case = law_case_factory()
@@ -241,6 +397,43 @@ def test_questionaire_detail_view(rf, questionaire_factory):
     assert Questionaire.objects.get(id=qn.id).title == 'New Title'
 
 
+@pytest.mark.django_db
+def test_questionaire_questions_view(rf, questionaire_factory):
+    qn = questionaire_factory()
+    question = Question.add_root(**get_text_question(questionaire=qn))
+    for index in range(4):
+        question = question.add_child(**get_single_option_question(questionaire=qn))
+    Question.objects.filter(id=question.id).update(options={})
+
+    request = rf.get('/', {'offset': 3, 'limit': 10})
+    response = QuestionaireQuestions.as_view()(request, pk=qn.id)
+    data = json.loads(response.content)
+    assert data['count'] == 5
+    assert data['offset'] == 3
+    assert [item['depth'] for item in data['questions']] == [4, 5]
+    assert data['questions'][-1]['id'] == question.id
+    assert data['questions'][-1]['has_error']
+    assert data['questions'][-1]['url'] == '/advicebuilder/admin/question/{}/edit'.format(question.id)
+
+    request = rf.get('/', {'limit': 'x'})
+    response = QuestionaireQuestions.as_view()(request, pk=qn.id)
+    assert len(json.loads(response.content)['questions']) == 5
+
+
+@pytest.mark.django_db
+def test_questionaire_detail_view_fetches_object_once(rf, questionaire_factory,
+                                                      django_assert_max_num_queries):
+    qn = questionaire_factory()
+    question = Question.add_root(**get_text_question(questionaire=qn))
+    for index in range(20):
+        question = question.add_child(**get_text_question(questionaire=qn))
+    request = rf.get('/')
+    with django_assert_max_num_queries(12):
+        response = QuestionaireDetail.as_view()(request, pk=qn.id)
+        response.render()
+    assert b'data-count="21"' in response.content
+
+
 @pytest.mark.django_db
 def test_question_delete_view(rf, questionaire_factory):
     qn = questionaire_factory()
@@ -12,6 +12,7 @@ from legal_advice_builder.forms import RenderedDocumentForm
 from legal_advice_builder.models import Condition
 from legal_advice_builder.models import Document
 from legal_advice_builder.models import Question
+from legal_advice_builder.models import Questionaire
 
 from .helpers import get_question
 from .helpers import get_single_option_question
@@ -173,6 +174,69 @@ def test_question_condition_form():
     assert Condition.objects.all().first().then_question is None
 
 
+@pytest.mark.django_db
+def test_question_condition_form_saves_changes_only(questionaire_factory,
+                                                    django_assert_num_queries):
+    questionaire = questionaire_factory()
+    question = Question.add_root(**get_single_option_question(questionaire=questionaire))
+    questions = [question.add_child(**get_single_option_question(questionaire=questionaire))
+                 for index in range(3)]
+    kept = Condition.objects.create(question=question, if_option='is',
+                                    if_value='yes', then_value='success')
+    Condition.objects.create(question=question, if_option='is',
+                             if_value='no', then_value='failure')
+
+    conditions = [
+        {'id': kept.id, 'if_option': 'is', 'if_value': 'yes', 'then_value': 'success'},
+        {'if_option': 'is', 'if_value': 'maybe', 'then_value': 'question',
+         'then_question': questions[0].id},
+        {'if_option': 'is', 'if_value': 'other', 'then_value': 'question',
+         'then_question': str(questions[1].id)},
+    ]
+    form = QuestionConditionForm(instance=question,
+                                 data={'conditions': json.dumps(conditions)})
+    assert form.is_valid()
+    version = questionaire.version
+    with django_assert_num_queries(7):
+        form.save()
+    assert Condition.objects.get(id=kept.id) == kept
+    assert [(c.if_value, c.then_question) for c in question.conditions.order_by('if_value')] == [
+        ('maybe', questions[0]), ('other', questions[1]), ('yes', None)]
+    questionaire.refresh_from_db()
+    assert questionaire.version != version
+
+    version = questionaire.version
+    form = QuestionConditionForm(instance=question,
+                                 data={'conditions': json.dumps(conditions)})
+    assert form.is_valid()
+    form.save()
+    questionaire.refresh_from_db()
+    assert questionaire.version == version
+
+
+@pytest.mark.django_db
+def test_question_condition_form_keeps_version_of_unchanged_text_question(
+        questionaire_factory):
+    questionaire = questionaire_factory()
+    question = Question.add_root(**get_text_question(questionaire=questionaire))
+    question.add_child(**get_text_question(questionaire=questionaire))
+    question = Question.objects.get(id=question.id)
+    version = Questionaire.objects.get(id=questionaire.id).version
+
+    form = QuestionConditionForm(instance=question,
+                                 data={'default_next': 'default', 'conditions': ''})
+    assert form.is_valid()
+    form.save()
+    assert Questionaire.objects.get(id=questionaire.id).version == version
+
+    form = QuestionConditionForm(instance=question,
+                                 data={'default_next': 'next', 'conditions': ''})
+    assert form.is_valid()
+    form.save()
+    assert Question.objects.get(id=question.id).is_last
+    assert Questionaire.objects.get(id=questionaire.id).version != version
+
+
 @pytest.mark.django_db
 def test_question_update_form():
 
@@ -0,0 +1,35 @@
+import pytest
+from django.db import connection
+
+from legal_advice_builder.models import Answer
+from legal_advice_builder.models import Questionaire
+
+pytestmark = pytest.mark.skipif(connection.vendor != 'sqlite',
+                                reason='query plans are checked on SQLite only')
+
+
+@pytest.mark.django_db
+def test_answer_list_uses_index(law_case_factory):
+    law_case = law_case_factory()
+    answers = Answer.objects.filter(law_case=law_case).order_by('-created_at')
+    plan = answers.explain()
+    assert 'answer_law_case_created_idx' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+@pytest.mark.django_db
+def test_questions_of_questionaire_use_index(questionaire_factory):
+    qn = questionaire_factory()
+    plan = qn.questions.explain()
+    assert 'question_questionaire_path_idx' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+@pytest.mark.django_db
+def test_next_questionaire_uses_index(law_case_factory, questionaire_factory):
+    law_case = law_case_factory()
+    qn = questionaire_factory(law_case=law_case, order=1)
+    next_questionaires = Questionaire.objects.filter(law_case=law_case, order__gt=qn.order)
+    plan = next_questionaires.explain()
+    assert 'questionaire_law_case_idx' in plan
+    assert 'TEMP B-TREE' not in plan
@@ -0,0 +1,124 @@
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.template import Template
+
+from legal_advice_builder import rendering
+from legal_advice_builder.models import Question
+from legal_advice_builder.rendering import DOCUMENT_PLACEHOLDER
+from legal_advice_builder.rendering import DjangoTemplateRenderer
+from legal_advice_builder.rendering import PlaceholderRenderer
+from legal_advice_builder.rendering import PlaceholderTemplate
+from legal_advice_builder.rendering import get_renderer
+from legal_advice_builder.rendering import stream_template
+
+from .helpers import get_text_question
+
+
+def test_placeholder_renderer_escapes_like_django():
+    text = '<p>{{ answers.qn_name }} {{answers.qn_date}} {{ answers.qn_list }} {{ answers.qn_missing }}</p>'
+    answers_dict = {
+        'qn_name': '<b>Mickey</b> & "Mouse"',
+        'qn_date': datetime.date(2020, 1, 10),
+        'qn_list': ['a', "b'"]
+    }
+    compiled = PlaceholderRenderer().compile(text)
+    assert isinstance(compiled, PlaceholderTemplate)
+    assert (PlaceholderRenderer().render(compiled, answers_dict) ==
+            DjangoTemplateRenderer().render_text(text, answers_dict))
+
+
+def test_placeholder_renderer_falls_back_to_django():
+    renderer = PlaceholderRenderer()
+    for text in ['{% if answers.qn_a == "x" %}yes{% endif %}',
+                 '{{ answers.qn_a|upper }}',
+                 '{# comment #}']:
+        assert isinstance(renderer.compile(text), Template)
+    assert renderer.render_text('{{ answers.qn_a|upper }}', {'qn_a': 'x'}) == 'X'
+
+
+@pytest.mark.django_db
+def test_text_block_render_keeps_compiled_template(monkeypatch, document_factory,
+                                                   text_block_factory):
+    compiled = []
+    compile = DjangoTemplateRenderer.compile
+
+    def counting_compile(renderer, text):
+        compiled.append(text)
+        return compile(renderer, text)
+
+    monkeypatch.setattr(DjangoTemplateRenderer, 'compile', counting_compile)
+    text_block = text_block_factory(document=document_factory(), order=1,
+                                    content='<p>{{ answers.qn_a }}</p>')
+    assert text_block.render({'qn_a': 'a'}) == '<p>a</p>'
+    assert text_block.render({'qn_a': 'b'}) == '<p>b</p>'
+    assert len(compiled) == 1
+
+    text_block.content = '<b>{{ answers.qn_a }}</b>'
+    assert text_block.render({'qn_a': 'a'}) == '<b>a</b>'
+    assert len(compiled) == 2
+
+
+def test_is_self_contained_parses_once(monkeypatch):
+    parsed = []
+    parses = rendering.parses
+
+    def counting_parses(text):
+        parsed.append(text)
+        return parses(text)
+
+    monkeypatch.setattr(rendering, 'parses', counting_parses)
+    assert not rendering.is_self_contained('{% if answers.qn_a %}')
+    assert not rendering.is_self_contained('{% if answers.qn_a %}')
+    assert rendering.is_self_contained('{% if answers.qn_a %}a{% endif %}')
+    assert rendering.is_self_contained('<p>{{ answers.qn_a }}</p>')
+    assert len(parsed) == 2
+
+
+def test_get_answer_keys():
+    assert rendering.get_answer_keys('{{ answers.qn_a }}{% if answers.qn_b %}{% endif %}') == {
+        'qn_a', 'qn_b'}
+    assert rendering.get_answer_keys('{% for key, value in answers.items %}{% endfor %}') is None
+    assert rendering.get_placeholder_positions('{{ answers.items }}') == {}
+
+
+def test_get_renderer(settings):
+    assert isinstance(get_renderer(), DjangoTemplateRenderer)
+    settings.LEGAL_ADVICE_BUILDER_RENDERER = 'legal_advice_builder.rendering.PlaceholderRenderer'
+    assert isinstance(get_renderer(), PlaceholderRenderer)
+
+
+@pytest.mark.django_db
+def test_template_with_answers_placeholder_renderer(settings,
+                                                    law_case_factory,
+                                                    questionaire_factory,
+                                                    text_block_factory,
+                                                    document_factory):
+    settings.LEGAL_ADVICE_BUILDER_RENDERER = 'legal_advice_builder.rendering.PlaceholderRenderer'
+    document = document_factory()
+    law_case = law_case_factory(document=document)
+    questionaire = questionaire_factory(short_title='qn_1', law_case=law_case)
+    q1 = Question.add_root(
+        **get_text_question(questionaire=questionaire, short_title='name'))
+
+    text_block_factory(document=document, order=1,
+                       content='<p>{{ answers.qn_1_name }}</p>')
+
+    answers = [{'question': str(q1.id), 'text': 'Mickey & Mouse'}]
+    assert document.template_with_answers(answers) == '<p>Mickey &amp; Mouse</p>'
+
+
+def test_benchmark_rendering():
+    out = StringIO()
+    call_command('benchmark_rendering', blocks=2, iterations=1, stdout=out)
+    assert 'PlaceholderRenderer' in out.getvalue()
+
+
+def test_stream_template():
+    chunks = stream_template('legal_advice_builder/pdf_download.html',
+                             {'answer': DOCUMENT_PLACEHOLDER},
+                             iter(['<p>a</p>', ' <p>b</p>']))
+    assert ''.join(chunks).split() == [
+        '<html>', '<body>', '<p>a</p>', '<p>b</p>', '</body>', '</html>']
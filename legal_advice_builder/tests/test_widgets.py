@@ -1,5 +1,8 @@
+import json
+
 import pytest
 
+from legal_advice_builder.admin_views import QuestionaireConditions
 from legal_advice_builder.models import Question
 from legal_advice_builder.widgets import ConditionsWidget
 
@@ -34,3 +37,48 @@ def test_conditions_widget(questionaire_factory):
     assert cw.get_default_next() == ''
 
     assert 'initial' in cw.get_context('conditions', None, {'id': 'id_conditions'})
+
+
+@pytest.mark.django_db
+def test_conditions_widget_payload_is_cached(rf, law_case_factory, questionaire_factory,
+                                             django_assert_num_queries):
+    law_case = law_case_factory()
+    qn = questionaire_factory(law_case=law_case, order=1)
+    q_1 = Question.add_root(**get_text_question(questionaire=qn))
+    q_2 = q_1.add_child(**get_text_question(questionaire=qn))
+    q_1 = Question.objects.select_related('questionaire').get(id=q_1.id)
+
+    context = ConditionsWidget(question=q_1).get_context('conditions', None, {})
+    url = context['payload_url']
+    assert url.startswith('/advicebuilder/admin/questionaire/{}/conditions/?'.format(qn.id))
+    assert 'questions' not in context
+
+    def get_payload():
+        response = QuestionaireConditions.as_view()(rf.get(url), pk=qn.id)
+        assert 'private' in response['Cache-Control']
+        return json.loads(response.content)
+
+    get_payload()
+    with django_assert_num_queries(1):
+        payload = get_payload()
+    assert payload['questions'] == [{'id': q_1.id, 'text': str(q_1.text)},
+                                    {'id': q_2.id, 'text': str(q_2.text)}]
+    assert payload['success_option'] == 'Show success message'
+
+    questionaire_factory(law_case=law_case, order=2)
+    q_2.text = 'Changed'
+    q_2.save()
+    q_1 = Question.objects.select_related('questionaire').get(id=q_1.id)
+    context = ConditionsWidget(question=q_1).get_context('conditions', None, {})
+    assert not context['payload_url'] == url
+    url = context['payload_url']
+    payload = get_payload()
+    assert payload['questions'][1] == {'id': q_2.id, 'text': 'Changed'}
+    assert payload['success_option'] == 'Jump to next questionaire'
+
+
+@pytest.mark.django_db
+def test_conditions_widget_unknown_field_type(questionaire_factory):
+    q_1 = Question.add_root(**get_text_question(questionaire=questionaire_factory()))
+    q_1.field_type = Question.FILE_UPLOAD
+    assert ConditionsWidget(question=q_1).get_if_options() == {}
@@ -1,13 +1,20 @@
 import json
 
 import pytest
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from legal_advice_builder.cache import get_cache
 from legal_advice_builder.models import Answer
 from legal_advice_builder.models import Condition
+from legal_advice_builder.models import Document
 from legal_advice_builder.models import LawCase
 from legal_advice_builder.models import Question
+from legal_advice_builder.signals import answer_created
+from legal_advice_builder.utils import generate_answers_dict_for_template
 from legal_advice_builder.views import FormWizardView
 
 from .helpers import get_date_question
@@ -443,7 +450,8 @@ def test_form_wizard_next_in_post(rf, law_case_factory,
 def test_form_wizard_render_done(rf, law_case_factory,
                                  create_user,
                                  document_factory,
-                                 questionaire_factory):
+                                 questionaire_factory,
+                                 monkeypatch):
 
     class TestWizardView(FormWizardView):
 
@@ -476,8 +484,17 @@ def test_form_wizard_render_done(rf, law_case_factory,
     }, cls=DjangoJSONEncoder)
     request.session.save()
     assert Answer.objects.all().count() == 0
+    rendered = []
+    template_with_answers = Document.template_with_answers
+
+    def counting_template_with_answers(document, answers, questions=None):
+        rendered.append(answers)
+        return template_with_answers(document, answers, questions=questions)
+
+    monkeypatch.setattr(Document, 'template_with_answers', counting_template_with_answers)
     TestWizardView.as_view()(request)
     assert Answer.objects.all().count() == 1
+    assert len(rendered) == 1
 
 
 @pytest.mark.django_db
@@ -588,3 +605,310 @@ def test_form_wizard_test_date_formating(rf, law_case_factory, questionaire_fact
     request.session.save()
     resp = TestWizardView.as_view()(request)
     assert resp.context_data.get('view').storage.get_data().get('answers')[0].get('date') == '2021-10-10'
+
+
+@pytest.mark.django_db
+def test_form_wizard_streams_download(rf, law_case_factory,
+                                      document_factory,
+                                      text_block_factory,
+                                      questionaire_factory):
+    html = []
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+        def get_pdf_file(self, html_chunks):
+            html.append(''.join(html_chunks))
+            return super().get_pdf_file(html)
+
+    d = document_factory()
+    text_block_factory(document=d, order=1, content='<p>first</p>')
+    text_block_factory(document=d, order=2, content='<p>second</p>')
+    lc = law_case_factory(document=d, allow_download=True)
+    qn1 = questionaire_factory(law_case=lc)
+    q1 = Question.add_root(**get_single_option_question(
+        questionaire=qn1
+    ))
+
+    answers = [{'question': q1.id, 'option': 'yes'}]
+    data = {'download': 'download'}
+    request = rf.post('/', data)
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+    request.session[praefix] = json.dumps({
+        'current_question': q1.id,
+        'answers': answers
+    }, cls=DjangoJSONEncoder)
+    request.session.save()
+    resp = TestWizardView.as_view()(request)
+    assert resp.streaming
+    assert resp['content-type'] == 'application/pdf'
+    assert '<p>first</p> <p>second</p>' in html[0]
+
+    document = Document.objects.get(id=d.id)
+    cache_key = document.get_cache_key(generate_answers_dict_for_template(answers))
+    assert get_cache().get(cache_key) == '<p>first</p> <p>second</p>'
+
+
+@pytest.mark.django_db
+def test_form_wizard_streams_done_page(rf, law_case_factory, document_factory,
+                                       text_block_factory, questionaire_factory):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    d = document_factory()
+    text_block_factory(document=d, order=1, content='<p>first</p>')
+    text_block_factory(document=d, order=2, content='<p>second</p>')
+    lc = law_case_factory(document=d, allow_download=True, save_answers=False)
+    qn1 = questionaire_factory(law_case=lc)
+    q1 = Question.add_root(**get_single_option_question(questionaire=qn1))
+
+    request = rf.post('/', {'question': q1.id, 'option': 'yes'})
+    request.user = AnonymousUser()
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+    request.session[praefix] = json.dumps({
+        'current_question': q1.id,
+        'answers': []
+    }, cls=DjangoJSONEncoder)
+    request.session.save()
+    resp = TestWizardView.as_view()(request)
+    assert resp.streaming
+    content = b''.join(resp.streaming_content).decode()
+    assert '<p><p>first</p> <p>second</p></p>' in content
+    assert 'name="download"' in content
+    assert not Answer.objects.exists()
+
+
+@pytest.mark.django_db
+def test_form_wizard_render_done_sends_answer_created_on_commit(
+        rf, law_case_factory, create_user, document_factory,
+        text_block_factory, questionaire_factory,
+        django_capture_on_commit_callbacks):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(Answer.objects.get(id=sender.id))
+
+    d = document_factory()
+    text_block_factory(document=d, order=1, content='<p>document</p>')
+    lc = law_case_factory(save_answers=True, document=d)
+    qn1 = questionaire_factory(law_case=lc)
+    q1 = Question.add_root(**get_single_option_question(
+        questionaire=qn1
+    ))
+
+    data = {'question': q1.id, 'option': 'yes'}
+    request = rf.post('/', data)
+    request.user = create_user(email='foo@bar.com', password='bar', username='user')
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+    request.session[praefix] = json.dumps({
+        'current_question': q1.id,
+        'answers': []
+    }, cls=DjangoJSONEncoder)
+    request.session.save()
+
+    answer_created.connect(receiver)
+    try:
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            TestWizardView.as_view()(request)
+            assert received == []
+    finally:
+        answer_created.disconnect(receiver)
+
+    assert len(callbacks) == 1
+    assert len(received) == 1
+    assert received[0].creator == request.user
+    assert received[0].rendered_document == '<p>document</p>'
+
+
+@pytest.mark.django_db
+def test_form_wizard_render_done_is_idempotent(rf, law_case_factory,
+                                               document_factory,
+                                               questionaire_factory):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    d = document_factory()
+    lc = law_case_factory(save_answers=True, document=d)
+    qn1 = questionaire_factory(law_case=lc)
+    q1 = Question.add_root(**get_single_option_question(
+        questionaire=qn1
+    ))
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+
+    request = rf.get('/')
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    request.session.save()
+    resp = TestWizardView.as_view()(request)
+    session_data = resp._request.session.get(praefix)
+    assert json.loads(session_data).get('run_token')
+
+    def complete(option):
+        request = rf.post('/', {'question': q1.id, 'option': option})
+        request.user = AnonymousUser()
+        middleware = SessionMiddleware(dummy_get_response)
+        middleware.process_request(request)
+        request.session[praefix] = session_data
+        request.session.save()
+        return TestWizardView.as_view()(request)
+
+    first = complete('yes')
+    second = complete('yes')
+    assert Answer.objects.all().count() == 1
+    assert (first.context_data.get('answer_form').instance ==
+            second.context_data.get('answer_form').instance)
+
+    complete('no')
+    assert Answer.objects.all().count() == 2
+
+
+@pytest.mark.django_db
+def test_form_wizard_uses_published_snapshot(rf, law_case_factory, document_factory,
+                                             questionaire_factory):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    lc = law_case_factory(document=document_factory())
+    qn1 = questionaire_factory(law_case=lc, order=1)
+    q1 = Question.add_root(**get_single_option_question(questionaire=qn1))
+    q2 = q1.add_child(**get_single_option_question(questionaire=qn1))
+    assert lc.publish().version == 1
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+
+    def start():
+        request = rf.get('/')
+        middleware = SessionMiddleware(dummy_get_response)
+        middleware.process_request(request)
+        request.session.save()
+        return TestWizardView.as_view()(request)._request.session.get(praefix)
+
+    def answer(session_data, option):
+        request = rf.post('/', {'question': q1.id, 'option': option})
+        request.user = AnonymousUser()
+        middleware = SessionMiddleware(dummy_get_response)
+        middleware.process_request(request)
+        request.session[praefix] = session_data
+        request.session.save()
+        return TestWizardView.as_view()(request)
+
+    session_data = start()
+    assert json.loads(session_data).get('snapshot_version') == 1
+
+    Condition.objects.create(question=q1, if_option='is', if_value='yes',
+                             then_value='failure', message='Not possible')
+    assert lc.publish().version == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = answer(session_data, 'yes')
+    assert resp.context_data.get('form').fields['question'].initial == q2.id
+    assert json.loads(resp._request.session.get(praefix)).get('snapshot_version') == 1
+    assert not [query for query in queries.captured_queries
+                if 'legal_advice_builder_question' in query['sql']
+                or 'legal_advice_builder_condition' in query['sql']]
+
+    resp = answer(start(), 'yes')
+    assert resp.context_data.get('failure')
+    assert resp.context_data.get('message') == 'Not possible'
+
+
+@pytest.mark.django_db
+def test_form_wizard_keeps_unpublished_runs_live(rf, law_case_factory, document_factory,
+                                                 questionaire_factory):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    lc = law_case_factory(document=document_factory())
+    qn1 = questionaire_factory(law_case=lc, order=1)
+    q1 = Question.add_root(**get_single_option_question(questionaire=qn1))
+    q1.add_child(**get_single_option_question(questionaire=qn1))
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+
+    request = rf.get('/')
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    request.session.save()
+    session_data = TestWizardView.as_view()(request)._request.session.get(praefix)
+    assert json.loads(session_data).get('snapshot_version') is None
+
+    lc.publish()
+    Condition.objects.create(question=q1, if_option='is', if_value='yes',
+                             then_value='failure', message='Not possible')
+
+    request = rf.post('/', {'question': q1.id, 'option': 'yes'})
+    request.user = AnonymousUser()
+    middleware.process_request(request)
+    request.session[praefix] = session_data
+    request.session.save()
+    resp = TestWizardView.as_view()(request)
+    assert resp.context_data.get('message') == 'Not possible'
+    assert json.loads(resp._request.session.get(praefix)).get('snapshot_version') is None
+
+
+@pytest.mark.django_db
+def test_form_wizard_pins_answers_to_snapshot(rf, law_case_factory, document_factory,
+                                              questionaire_factory, text_block_factory):
+
+    class TestWizardView(FormWizardView):
+
+        def get_lawcase(self):
+            return LawCase.objects.all().first()
+
+    d = document_factory()
+    lc = law_case_factory(save_answers=True, document=d)
+    qn1 = questionaire_factory(law_case=lc)
+    q1 = Question.add_root(**get_single_option_question(questionaire=qn1))
+    text_block = text_block_factory(document=d, order=1, content='<p>published</p>')
+    lc.publish()
+    praefix = 'legal_advice_builder_{}'.format(lc.id)
+
+    request = rf.post('/', {'question': q1.id, 'option': 'yes'})
+    request.user = AnonymousUser()
+    middleware = SessionMiddleware(dummy_get_response)
+    middleware.process_request(request)
+    request.session[praefix] = json.dumps({
+        'current_question': q1.id,
+        'answers': [],
+        'run_token': 'token',
+        'snapshot_version': 1
+    })
+    request.session.save()
+    with CaptureQueriesContext(connection) as queries:
+        resp = TestWizardView.as_view()(request)
+    assert resp.context_data.get('preview') == '<p>published</p>'
+    assert not [query for query in queries.captured_queries
+                if query['sql'].startswith('UPDATE "legal_advice_builder_answer"')]
+
+    answer = Answer.objects.get()
+    assert answer.snapshot_version == 1
+    assert answer.rendered_document == ''
+
+    text_block.content = '<p>changed</p>'
+    text_block.save()
+    lc.publish()
+    assert Answer.objects.get().get_rendered_document() == '<p>published</p>'
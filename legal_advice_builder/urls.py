@@ -7,9 +7,11 @@ from .admin_views import LawCaseDelete
 from .admin_views import LawCaseEdit
 from .admin_views import LawCaseList
 from .admin_views import LawCasePreview
+from .admin_views import QuestionaireConditions
 from .admin_views import QuestionaireCreate
 from .admin_views import QuestionaireDeleteView
 from .admin_views import QuestionaireDetail
+from .admin_views import QuestionaireQuestions
 from .admin_views import QuestionDelete
 from .admin_views import QuestionUpdate
 
@@ -22,6 +24,8 @@ urlpatterns = [
     path('<int:pk>/document/create/', DocumentCreateView.as_view(), name='document-create'),
     path('<int:pk>/questionaire/create/', QuestionaireCreate.as_view(), name='questionaire-create'),
     path('questionaire/<int:pk>/', QuestionaireDetail.as_view(), name='questionaire-detail'),
+    path('questionaire/<int:pk>/questions/', QuestionaireQuestions.as_view(), name='questionaire-questions'),
+    path('questionaire/<int:pk>/conditions/', QuestionaireConditions.as_view(), name='questionaire-conditions'),
     path('questionaire/<int:pk>/delete', QuestionaireDeleteView.as_view(), name='questionaire-delete'),
     path('question/<int:pk>/edit', QuestionUpdate.as_view(), name='question-update'),
     path('question/<int:pk>/delete', QuestionDelete.as_view(), name='question-delete'),
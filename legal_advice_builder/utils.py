@@ -1,14 +1,47 @@
 import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
-import bleach
+from bleach.sanitizer import Cleaner
+from django.db import connections
+from django.db import router
+from django.db.models import Max
 
+ALLOWED_TAGS = ['p', 'strong', 'em',
+                'u', 'ol', 'li', 'ul', 'h1',
+                'h2', 'h3', 'h4', 'h5']
+ALLOWED_ATTRIBUTES = {'*': ['style']}
+ALLOWED_STYLES = ['text-align']
 
-def generate_answers_dict_for_template(answers):
+CLEAN_DIGESTS_MAX_SIZE = 1000
+
+DEADLINE_OPTIONS = ['deadline_expired', 'deadline_running']
+
+cleaners = threading.local()
+version_bumps = threading.local()
+clean_digests = OrderedDict()
+clean_digests_lock = threading.Lock()
+
+
+def make_dict_key(questionaire_id, questionaire_short_title, question_id, question_short_title):
+    """Returns the key of a question's answer in the answers dict of the templates."""
+    questionaire_key = questionaire_short_title or 'questionaire_{}'.format(questionaire_id)
+    question_key = question_short_title or 'question_{}'.format(question_id)
+    return '{}_{}'.format(questionaire_key, question_key)
+
+
+def generate_answers_dict_for_template(answers, questions=None):
+    """Returns the answers by their dict key, questions maps ids to already loaded questions."""
     from .models import Question
 
     answers_dict = {}
     for answer in answers:
-        question = Question.objects.get(id=answer.get('question'))
+        if questions is not None:
+            question = questions[int(answer.get('question'))]
+        else:
+            question = Question.objects.get(id=answer.get('question'))
         option = answer.get('option')
         text = answer.get('text')
         date = answer.get('date')
@@ -22,14 +55,106 @@ def generate_answers_dict_for_template(answers):
     return answers_dict
 
 
+def bulk_create_with_pks(model, objects, batch_size=None):
+    """Creates the objects with bulk_create and sets their primary keys.
+
+    Backends that can't return the primary keys of bulk inserts get them
+    assigned in insert order. Must be called inside a transaction.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.features.can_return_rows_from_bulk_insert or not objects:
+        return model.objects.bulk_create(objects, batch_size=batch_size)
+    last_pk = model.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+    if len(pks) != len(objects):
+        raise RuntimeError('{} rows were inserted concurrently.'.format(model.__name__))
+    for obj, pk in zip(objects, pks):
+        obj.pk = pk
+        obj._state.adding = False
+    return objects
+
+
+@contextmanager
+def defer_version_bumps():
+    """Keeps the signal receivers from bumping versions in the current thread.
+
+    For bulk changes which bump the versions once when they are done.
+    """
+    version_bumps.deferred = getattr(version_bumps, 'deferred', 0) + 1
+    try:
+        yield
+    finally:
+        version_bumps.deferred -= 1
+
+
+def version_bumps_deferred():
+    return getattr(version_bumps, 'deferred', 0) > 0
+
+
+def get_cleaner():
+    """Returns the preconfigured cleaner of the current thread.
+
+    bleach cleaners are not thread-safe, so one is kept per thread.
+    """
+    if not hasattr(cleaners, 'cleaner'):
+        cleaners.cleaner = Cleaner(
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            styles=ALLOWED_STYLES,
+            strip=True
+        )
+    return cleaners.cleaner
+
+
 def clean_html_field(text, setting='default'):
-    allowed_tags = ['p', 'strong', 'em',
-                    'u', 'ol', 'li', 'ul', 'h1',
-                    'h2', 'h3', 'h4', 'h5']
-    allowed_attrs = {'*': ['style']}
-    allowed_styles = ['text-align']
-    return bleach.clean(text,
-                        tags=allowed_tags,
-                        attributes=allowed_attrs,
-                        styles=allowed_styles,
-                        strip=True)
+    if not text:
+        return text
+    digest = hashlib.sha1(text.encode()).digest()
+    with clean_digests_lock:
+        if digest in clean_digests:
+            clean_digests.move_to_end(digest)
+            return text
+    cleaned = get_cleaner().clean(text)
+    with clean_digests_lock:
+        clean_digests[hashlib.sha1(cleaned.encode()).digest()] = True
+        while len(clean_digests) > CLEAN_DIGESTS_MAX_SIZE:
+            clean_digests.popitem(last=False)
+    return cleaned
+
+
+class CleanHTMLFieldsMixin:
+    """Sanitizes the html of clean_html_fields on save if they were changed."""
+
+    clean_html_fields = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_html_fields()
+        return instance
+
+    def remember_html_fields(self, names=None):
+        if not hasattr(self, '_saved_html_fields'):
+            self._saved_html_fields = {}
+        deferred_fields = self.get_deferred_fields()
+        for name in names or self.clean_html_fields:
+            if name not in deferred_fields:
+                self._saved_html_fields[name] = getattr(self, name)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        deferred_fields = self.get_deferred_fields()
+        names = [name for name in self.clean_html_fields
+                 if name not in deferred_fields and
+                 (update_fields is None or name in update_fields)]
+        saved_html_fields = getattr(self, '_saved_html_fields', {})
+        for name in names:
+            value = getattr(self, name)
+            if name in saved_html_fields and saved_html_fields[name] == value:
+                continue
+            setattr(self, name, clean_html_field(value))
+        result = super().save(*args, **kwargs)
+        if names:
+            self.remember_html_fields(names)
+        return result
@@ -1,3 +1,5 @@
+import uuid
+
 from django.http import HttpResponseNotAllowed
 from django.template.loader import render_to_string
 from django.views.generic import TemplateView
@@ -8,7 +10,7 @@ from .mixins import GenerateEditableDocumentMixin
 from .mixins import GeneratePDFDownloadMixin
 from .mixins import GenrateFormWizardMixin
 from .models import Answer
-from .models import Question
+from .snapshot import get_published_law_case
 from .storage import SessionStorage
 
 
@@ -42,8 +44,10 @@ class FormWizardView(TemplateView,
 
     def get(self, request, *args, **kwargs):
         self.storage.reset()
-        questionaire = self.get_lawcase().get_first_questionaire()
-        question = questionaire.get_first_question()
+        self.run_token = uuid.uuid4().hex
+        # new runs always start on the currently published version
+        self.snapshot = get_published_law_case(self.law_case, self.law_case.published_version)
+        question = self.get_first_question()
         return self.render_next(question, [])
 
     def post(self, *args, **kwargs):
@@ -54,7 +58,7 @@ class FormWizardView(TemplateView,
         to_previous_question = self.request.POST.get('previous-question')
 
         if next_question:
-            next_question = Question.objects.get(id=next_question)
+            next_question = self.get_question(next_question)
             return self.render_next(next_question, answers)
 
         elif download:
@@ -73,7 +77,7 @@ class FormWizardView(TemplateView,
         elif to_previous_question:
             try:
                 previous_question = self.storage.get_data().get('answers')[-1]
-                next_question = Question.objects.get(id=previous_question.get('question'))
+                next_question = self.get_question(previous_question.get('question'))
                 del answers[-1]
                 return self.render_next(next_question, answers, initial_data=previous_question)
             except IndexError:
@@ -86,9 +90,9 @@ class FormWizardView(TemplateView,
 
     def get_progress(self):
         question = self.get_current_question()
-        questions = question.questionaire.questions
-        question_count = questions.count()
-        question_ids = questions.values_list('id', flat=True)
+        question_ids = [question.id for question in
+                        self.get_flow().get_questions(question.questionaire)]
+        question_count = len(question_ids)
         answers = self.storage.get_data().get('answers')
         answers_ids = [int(answer.get('question')) for answer in answers]
         answers_count = len([answer_id
@@ -101,20 +105,32 @@ class FormWizardView(TemplateView,
 
         return question_count, answers_count, percentage
 
+    def get_document(self):
+        snapshot = self.get_snapshot()
+        if snapshot:
+            return snapshot
+        return super().get_document()
+
+    def get_steps(self, questionaire):
+        """Returns the index of the questionaire and the number of questionaires."""
+        flow = self.get_flow()
+        return flow.get_index_of_questionaire(questionaire), flow.questionaire_count()
+
     def has_previuos_question(self):
         return not len(self.storage.get_data().get('answers', [])) == 0
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         qcount, acount, perc = self.get_progress()
+        question = self.get_current_question()
+        current_step, step_count = self.get_steps(question.questionaire)
         context.update({
             'allow_download': self.allow_download,
             'save_answers_enabled': self.save_answers,
             'law_case': self.get_lawcase(),
-            'question': self.get_current_question(),
-            'current_step': self.law_case.get_index_of_questionaire(
-                self.get_current_question().questionaire),
-            'step_count': self.law_case.questionaire_count(),
+            'question': question,
+            'current_step': current_step,
+            'step_count': step_count,
             'progess': perc,
             'answer_count': acount,
             'question_count': qcount,
@@ -134,7 +150,7 @@ class PdfDownloadView(TemplateView, GeneratePDFDownloadMixin):
     def get_html_string(self):
         ctx = self.get_context_data()
         ctx.update({
-            'answer': self.get_answer().rendered_document
+            'answer': self.get_answer().get_rendered_document()
         })
         return render_to_string(self.download_template_name, ctx)
 
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+
+from .mixins import get_default_stylesheets
+from .models import LawCase
+from .snapshot import get_published_law_case
+from .widgets import get_conditions_payload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+WARMUP_DISPATCH_UID = 'legal_advice_builder_warmup'
+
+
+def warm_law_case(law_case):
+    """Loads the published flow, the editor payloads and the rendered sample document into the cache.
+
+    Rendering the sample document also keeps the compiled templates of
+    its textblocks in the memory of the process.
+    """
+    published = get_published_law_case(law_case, law_case.published_version)
+    for questionaire in law_case.questionaire_set.all():
+        get_conditions_payload(questionaire)
+    document = law_case.document
+    if document:
+        document.get_placeholder_index()
+        document.get_initial_fields_dict()
+        document.template_with_answers(document.sample_answers or [])
+    if published and published.document:
+        published.template_with_answers(published.document.sample_answers or [])
+
+
+def time_law_case(law_case):
+    """Returns the law case, the seconds it took to warm it and the error, if any."""
+    start = time.perf_counter()
+    error = None
+    try:
+        warm_law_case(law_case)
+    except Exception as exception:
+        error = exception
+    return law_case, time.perf_counter() - start, error
+
+
+def time_law_case_in_thread(law_case):
+    try:
+        return time_law_case(law_case)
+    finally:
+        connections.close_all()
+
+
+def warm_caches(law_cases=None, workers=DEFAULT_WORKERS):
+    """Warms the caches of the law cases, by default all, in parallel.
+
+    Yields (law case, seconds, error) as the law cases are done.
+    """
+    get_default_stylesheets()
+    if law_cases is None:
+        law_cases = LawCase.objects.select_related('document')
+    if workers <= 1:
+        for law_case in law_cases:
+            yield time_law_case(law_case)
+        return
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix='legal_advice_builder_warmup') as executor:
+        yield from executor.map(time_law_case_in_thread, list(law_cases))
+
+
+def warm_caches_in_background():
+    """Warms the caches of all law cases, logging the results."""
+    workers = getattr(settings, 'LEGAL_ADVICE_BUILDER_WARM_CACHES_WORKERS', DEFAULT_WORKERS)
+    try:
+        for law_case, seconds, error in warm_caches(workers=workers):
+            if error:
+                logger.error('warming the caches of law case %s failed', law_case.id,
+                             exc_info=error)
+            else:
+                logger.info('warmed the caches of law case %s in %.2fs', law_case.id, seconds)
+    except Exception:
+        logger.exception('warming the caches failed')
+    finally:
+        connections.close_all()
+
+
+def warm_caches_on_first_request(**kwargs):
+    """Starts warming the caches in a background thread on the first request of the process.
+
+    Connected to request_started if LEGAL_ADVICE_BUILDER_WARM_CACHES is
+    set, so management commands and other processes that don't serve
+    requests don't warm their caches.
+    """
+    if not request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID):
+        # another thread of the process got the first request
+        return
+    threading.Thread(target=warm_caches_in_background, daemon=True,
+                     name='legal_advice_builder_warmup').start()
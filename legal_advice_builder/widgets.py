@@ -1,9 +1,14 @@
 import json
+from urllib.parse import urlencode
 
 from django import forms
-from django.forms.models import model_to_dict
+from django.urls import reverse
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
+from .cache import get_cache
+from .cache import make_key
+
 
 class ChoiceWidget(forms.TextInput):
     template_name = 'legal_advice_builder/admin/choices_widget_template.html'
@@ -12,6 +17,51 @@ class ChoiceWidget(forms.TextInput):
         js = ('choice_field.js',)
 
 
+def build_conditions_payload(questionaire):
+    from .models import Question
+    question = Question(questionaire=questionaire)
+    if_options, if_texts = {}, {}
+    for field_type, label in Question.FIELD_TYPES:
+        question.field_type = field_type
+        if_options[field_type] = question.get_options_by_type()
+        if_texts[field_type] = str(question.get_if_text_by_type())
+    if questionaire.next():
+        success_option = str(_('Jump to next questionaire'))
+    elif questionaire.law_case.document_id:
+        success_option = str(_('Show result document'))
+    else:
+        success_option = str(_('Show success message'))
+    period_options = {
+        'days': str(_('Days')),
+        'months': str(_('Months')),
+        'years': str(_('years'))
+    }
+    return {
+        'questions': list(questionaire.questions.values('id', 'text')),
+        'if_options': if_options,
+        'if_texts': if_texts,
+        'failure_option': str(_('failure: show failure message')),
+        'question_option': str(_('jump to question:')),
+        'success_option': success_option,
+        'period_options': period_options,
+        'then_text': str(_('then'))
+    }
+
+
+def get_conditions_payload(questionaire):
+    """Returns the authoring data of the ConditionsWidget shared by all questions of a questionaire.
+
+    The payload is cached per questionaire version and language.
+    """
+    cache = get_cache()
+    cache_key = make_key('conditions_widget', questionaire.id, questionaire.version, get_language())
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = build_conditions_payload(questionaire)
+        cache.set(cache_key, payload)
+    return payload
+
+
 class ConditionsWidget(forms.TextInput):
     template_name = 'legal_advice_builder/admin/conditions_widget_template.html'
 
@@ -22,44 +72,35 @@ class ConditionsWidget(forms.TextInput):
         self.question = question
         return super().__init__(attrs=attrs)
 
+    def get_payload(self):
+        return get_conditions_payload(self.question.questionaire)
+
     def get_other_questions(self):
-        questions = self.question.questionaire.questions.exclude(
-            id=self.question.id)
-        return [{'id': question.id,
-                 'text': question.text} for question in questions]
+        return [question for question in self.get_payload()['questions']
+                if question['id'] != self.question.id]
 
     def create_conditions_dict(self):
-        conditions = [
-            model_to_dict(condition) for condition in self.question.conditions.all()
-        ]
-        return conditions
+        return list(self.question.conditions.values(
+            'id', 'question', 'if_option', 'if_value',
+            'then_value', 'then_question', 'message'))
 
     def get_if_options(self):
-        return self.question.get_options_by_type()
+        return self.get_payload()['if_options'].get(self.question.field_type, {})
 
-    def get_then_options(self):
+    def get_then_options(self, other_questions=None):
+        if other_questions is None:
+            other_questions = self.get_other_questions()
+        payload = self.get_payload()
         res = {
-            'failure': str(_('failure: show failure message')),
+            'failure': payload['failure_option'],
         }
-        if self.get_other_questions():
-            res['question'] = str(_('jump to question:'))
-
-        questionaire = self.question.questionaire
-        if questionaire.next():
-            res['success'] = str(_('Jump to next questionaire'))
-        else:
-            if questionaire.law_case.document:
-                res['success'] = str(_('Show result document'))
-            else:
-                res['success'] = str(_('Show success message'))
+        if other_questions:
+            res['question'] = payload['question_option']
+        res['success'] = payload['success_option']
         return res
 
     def get_period_options(self):
-        return {
-            'days': str(_('Days')),
-            'months': str(_('Months')),
-            'years': str(_('years'))
-        }
+        return self.get_payload()['period_options']
 
     def get_default_next(self):
         children = self.question.get_children()
@@ -67,22 +108,24 @@ class ConditionsWidget(forms.TextInput):
             return children.first().id
         return ''
 
+    def get_payload_url(self):
+        """Returns the url of the shared payload, which changes with the questionaire's version."""
+        questionaire = self.question.questionaire
+        url = reverse('legal_advice_builder:questionaire-conditions', args=[questionaire.id])
+        return '{}?{}'.format(url, urlencode({
+            'version': questionaire.version,
+            'language': get_language()
+        }))
+
     def get_context(self, name, value, attrs):
         context = super().get_context(name, value, attrs)
         context.update({
             'initial': json.dumps(self.create_conditions_dict()),
-            'questions': json.dumps(self.get_other_questions()),
             'default_next': self.get_default_next(),
             'question_id': str(self.question.id),
-            'if_options': json.dumps(self.get_if_options()),
             'options': json.dumps(self.question.options),
-            'then_options': json.dumps(self.get_then_options()),
-            'period_options': json.dumps(self.get_period_options()),
             'question_type': self.question.field_type,
-            'text': json.dumps({
-                'if': str(self.question.get_if_text_by_type()),
-                'then': str(_('then'))
-            })
+            'payload_url': self.get_payload_url()
         })
         return context
 